@@ -1 +1,11 @@
-from data.data_io import pickle_obj_mapping, load_pickled_obj
+from data.data_io import (
+    pickle_obj_mapping,
+    load_pickled_obj,
+    append_records,
+    load_records,
+    repair_records,
+    iter_records,
+    tee_records,
+    save_records,
+    save_lookup_table,
+)
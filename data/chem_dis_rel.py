@@ -1,29 +1,65 @@
+from typing import Dict, Iterator, List, Tuple
 import pandas as pd
-from data import load_pickled_obj
+from data.lookup import load_lookup
 
 
 class ParseDiseChemRel(object):
     """parse genes_diseases_relation.csv"""
 
-    def __init__(self, input_file, dise_file, chem_file):
+    DTYPES = {"ChemicalID": str, "DiseaseID": str, "pmids": str}
+
+    def __init__(
+        self,
+        input_file,
+        dise_file,
+        chem_file,
+        chunk_size=10000,
+        streaming=False,
+        usecols=None,
+    ):
+        """
+        :param input_file: relation csv
+        :param chunk_size: number of rows converted per batch
+        :param streaming: read input_file in chunks of chunk_size rows while iterating
+        instead of loading it all at once
+        :param usecols: only read these columns
+        """
         print(f"building DiseChemRel parser...")
-        self.csv_df = pd.read_csv(input_file)
-        self.dise_mapping = load_pickled_obj(dise_file)
-        self.chem_mapping = load_pickled_obj(chem_file)
-
-    def _quick_process(self, sub_df: pd.DataFrame):
-        line_dict = sub_df.fillna("").to_dict()
-        line_dict["Disease"] = self.dise_mapping.get(line_dict["DiseaseID"], None)
-        line_dict["Chemical"] = self.chem_mapping.get(
-            f"MESH:{line_dict['ChemicalID']}", None
+        self.input_file = input_file
+        self.usecols = usecols
+        self.csv_df = (
+            None
+            if streaming
+            else pd.read_csv(input_file, dtype=self.DTYPES, usecols=usecols)
         )
-        pmids_lst = line_dict["pmids"].split("|")
-        del line_dict["pmids"]
-        return line_dict, pmids_lst
+        self.dise_lookup = load_lookup(dise_file)
+        self.chem_lookup = load_lookup(chem_file)
+        self.chunk_size = chunk_size
+
+    def _batch_process(self, sub_df: pd.DataFrame) -> Iterator[Tuple[Dict, List[str]]]:
+        sub_df = sub_df.fillna("")
+        disease = self.dise_lookup.map(sub_df["DiseaseID"])
+        sub_df["Disease"] = disease.where(disease.notna(), None)
+        chemical = self.chem_lookup.map("MESH:" + sub_df["ChemicalID"].astype(str))
+        sub_df["Chemical"] = chemical.where(chemical.notna(), None)
+        pmids_lsts = sub_df.pop("pmids").str.split("|").tolist()
+        return zip(sub_df.to_dict("records"), pmids_lsts)
+
+    def _iter_chunks(self) -> Iterator[pd.DataFrame]:
+        if self.csv_df is not None:
+            for start in range(0, len(self.csv_df), self.chunk_size):
+                yield self.csv_df.iloc[start : start + self.chunk_size]
+        else:
+            yield from pd.read_csv(
+                self.input_file,
+                chunksize=self.chunk_size,
+                dtype=self.DTYPES,
+                usecols=self.usecols,
+            )
 
     def __iter__(self):
-        for line in self.csv_df.iloc:
-            yield self._quick_process(line)
+        for chunk in self._iter_chunks():
+            yield from self._batch_process(chunk)
 
 
 if __name__ == "__main__":
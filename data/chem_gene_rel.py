@@ -1,42 +1,53 @@
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterator, List, Set, Tuple
 import pandas as pd
-from data import load_pickled_obj
+from data.lookup import load_lookup
 from data.dise_gene_rel import ParseDiseGeneRel
 
 
 class ParseChemGeneRel(object):
     """parse chem_gene_ixns_relation.csv"""
 
+    DTYPES = {
+        "ChemicalID": str,
+        "GeneID": str,
+        "OrganismID": "float64",
+        "InteractionActions": str,
+        "pmids": str,
+    }
+
     def __init__(
-        self, input_file, gene_file, chem_file, gene_dise_mapping: Dict[str, Set] = None
+        self,
+        input_file,
+        gene_file,
+        chem_file,
+        gene_dise_mapping: Dict[str, Set] = None,
+        chunk_size=10000,
+        streaming=False,
+        usecols=None,
     ):
+        """
+        :param input_file: relation csv
+        :param chunk_size: number of rows converted per batch
+        :param streaming: read input_file in chunks of chunk_size rows while iterating
+        instead of loading it all at once, __call__ is not available then
+        :param usecols: only read these columns
+        """
         print(f"building ChemGeneRel parser...")
-        self.csv_df = pd.read_csv(input_file, delimiter="\t")
+        self.input_file = input_file
+        self.usecols = usecols
+        self.csv_df = (
+            None
+            if streaming
+            else pd.read_csv(
+                input_file, delimiter="\t", dtype=self.DTYPES, usecols=usecols
+            )
+        )
         self.ACTION_MAPPING = {"increases": "++", "decreases": "--", "affects": "->"}
-        self.gene_mapping = load_pickled_obj(gene_file)
-        self.chem_mapping = load_pickled_obj(chem_file)
+        self.gene_lookup = load_lookup(gene_file)
+        self.chem_lookup = load_lookup(chem_file)
         self.gene_dise_mapping = gene_dise_mapping
-        # TODO: overlapped ids are precomputed and hardcoded here
-        self.overlapped_pmids = {
-            "17288598",
-            "17434272",
-            "19409407",
-            "19772353",
-            "20003521",
-            "23825585",
-            "24244327",
-            "24534281",
-            "24561310",
-            "25966753",
-            "26551751",
-            "26752173",
-            "26917416",
-            "27760801",
-            "28438630",
-            "28786057",
-            "28806546",
-            "29038090",
-        }
+        self.chunk_size = chunk_size
+        self.pmid_rows = None if streaming else self._index_pmids()
         self.CONTAINER_MAPPING = {
             "ADP-ribosylation": "ADP-ribosylator",
             "N-linked glycosylation": "N-linked glycosylator",
@@ -109,12 +120,23 @@ class ParseChemGeneRel(object):
                 act_inter_pairs[i] = " ".join([pair[0], pair[1]])
         return act_inter_pairs, container_lst
 
+    def _index_pmids(self) -> Dict[str, List[int]]:
+        """
+        map every pmid of the "|"-joined pmids column to the positions of its rows
+        :return:
+        """
+        # csv_df has a RangeIndex, so the "index" column holds row positions
+        pmids = self.csv_df["pmids"].fillna("").str.split("|").explode().reset_index()
+        pmids = pmids[pmids.pmids != ""].drop_duplicates()
+        return pmids.groupby("pmids", sort=False)["index"].agg(list).to_dict()
+
     def __call__(self, pmid: str) -> Dict[str, List]:
-        if pmid not in self.overlapped_pmids:
-            return {"action_interactions": []}
-        sub_df = self.csv_df[self.csv_df.pmids == pmid]
-        if not len(sub_df):
+        if self.pmid_rows is None:
+            raise TypeError("per-pmid lookup needs a non-streaming ChemGeneRel parser!")
+        rows = self.pmid_rows.get(pmid)
+        if not rows:
             return {"action_interactions": []}
+        sub_df = self.csv_df.iloc[rows]
         actions = []
         sub_df = sub_df.fillna("")
         for line in sub_df.iloc:
@@ -123,8 +145,8 @@ class ParseChemGeneRel(object):
             line_dict["OrganismID"] = (
                 str(int(line_dict["OrganismID"])) if line_dict["OrganismID"] else ""
             )
-            line_dict["Gene"] = self.gene_mapping.get(str(line_dict["GeneID"]), "")
-            line_dict["Chemical"] = self.chem_mapping.get(
+            line_dict["Gene"] = self.gene_lookup.get(str(line_dict["GeneID"]), "")
+            line_dict["Chemical"] = self.chem_lookup.get(
                 f"MESH:{line_dict['ChemicalID']}", ""
             )
             inter_action, containers = self._parse_interaction_actions(
@@ -139,31 +161,56 @@ class ParseChemGeneRel(object):
         # TODO: cleaning and more maybe
         raise NotImplementedError
 
-    def _quick_process(self, sub_df: pd.DataFrame):
-        line_dict = sub_df.fillna("").to_dict()
-        line_dict["GeneID"] = str(line_dict["GeneID"])
-        line_dict["OrganismID"] = (
-            str(int(line_dict["OrganismID"])) if line_dict["OrganismID"] else ""
+    def _batch_process(self, sub_df: pd.DataFrame) -> Iterator[Tuple[Dict, List[str]]]:
+        organism = sub_df["OrganismID"].fillna(0)
+        sub_df = sub_df.fillna("")
+        sub_df["GeneID"] = sub_df["GeneID"].astype(str)
+        sub_df["OrganismID"] = (
+            organism.astype("int64").astype(str).where(organism != 0, "")
         )
-        line_dict["Gene"] = self.gene_mapping.get(str(line_dict["GeneID"]), "")
-        line_dict["Chemical"] = self.chem_mapping.get(
-            f"MESH:{line_dict['ChemicalID']}", ""
+        sub_df["Gene"] = self.gene_lookup.map(sub_df["GeneID"]).fillna("")
+        sub_df["Chemical"] = self.chem_lookup.map(
+            "MESH:" + sub_df["ChemicalID"].astype(str)
+        ).fillna("")
+        parsed = [
+            self._parse_interaction_actions(inter_action, gene["GeneSymbol"])
+            for inter_action, gene in zip(sub_df["InteractionActions"], sub_df["Gene"])
+        ]
+        sub_df["InteractionActions"] = pd.Series(
+            [inter_action for inter_action, _ in parsed], index=sub_df.index, dtype=object
         )
-        inter_action, containers = self._parse_interaction_actions(
-            line_dict["InteractionActions"], line_dict["Gene"]["GeneSymbol"]
+        sub_df["Containers"] = pd.Series(
+            [containers for _, containers in parsed], index=sub_df.index, dtype=object
         )
-        line_dict["InteractionActions"] = inter_action
-        line_dict["Containers"] = containers
         if self.gene_dise_mapping:
-            dises = self.gene_dise_mapping.get(line_dict["GeneID"])
-            line_dict["diseases"] = list(dises) if dises else None
-        pmids_lst = line_dict["pmids"].split("|")
-        del line_dict["pmids"]
-        return line_dict, pmids_lst
+            # sorted, the iteration order of a set changes with the hash seed
+            sub_df["diseases"] = pd.Series(
+                [
+                    sorted(dises) if dises else None
+                    for dises in map(self.gene_dise_mapping.get, sub_df["GeneID"])
+                ],
+                index=sub_df.index,
+                dtype=object,
+            )
+        pmids_lsts = sub_df.pop("pmids").str.split("|").tolist()
+        return zip(sub_df.to_dict("records"), pmids_lsts)
+
+    def _iter_chunks(self) -> Iterator[pd.DataFrame]:
+        if self.csv_df is not None:
+            for start in range(0, len(self.csv_df), self.chunk_size):
+                yield self.csv_df.iloc[start : start + self.chunk_size]
+        else:
+            yield from pd.read_csv(
+                self.input_file,
+                delimiter="\t",
+                chunksize=self.chunk_size,
+                dtype=self.DTYPES,
+                usecols=self.usecols,
+            )
 
     def __iter__(self):
-        for line in self.csv_df.iloc:
-            yield self._quick_process(line)
+        for chunk in self._iter_chunks():
+            yield from self._batch_process(chunk)
 
 
 if __name__ == "__main__":
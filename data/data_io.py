@@ -1,12 +1,334 @@
-from typing import Any
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Mapping, Sequence
+import os
 import pickle
+import struct
+import importlib
+
+RECORD_LOG_MAGIC = b"RECLOG1\n"
+MSGPACK_LOG_MAGIC = b"MPKLOG1\n"
+FRAME_HEADER = struct.Struct("<Q")
+# files with these extensions are record logs of msgpack frames
+MSGPACK_EXTENSIONS = (".mpk", ".msgpack")
+# files with these extensions are arrow tables (ipc files or parquet)
+ARROW_EXTENSIONS = (".arrow", ".feather")
+PARQUET_EXTENSIONS = (".parquet",)
+# schema metadata key telling what kind of object a table was saved from
+TABLE_KIND = b"data_io.kind"
 
 
 def pickle_obj_mapping(obj: Any, path: str) -> None:
+    """
+    save obj, the format follows the extension of path:
+    .arrow/.feather/.parquet: a DataFrame, a list of flat dicts or a dict of flat dicts
+    .mpk/.msgpack: a record log of msgpack frames for a list of nested docs
+    anything else: pickle
+    :param obj:
+    :param path:
+    :return:
+    """
+    if path.endswith(ARROW_EXTENSIONS + PARQUET_EXTENSIONS):
+        return _save_table(obj, path)
+    if path.endswith(MSGPACK_EXTENSIONS):
+        return save_records(obj, path)
     with open(path, "wb") as file:
         return pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
 
 
 def load_pickled_obj(path: str) -> Any:
+    """
+    load an object saved by pickle_obj_mapping, tables come back as the kind of
+    object they were saved from
+    :param path:
+    :return:
+    """
+    if path.endswith(ARROW_EXTENSIONS + PARQUET_EXTENSIONS):
+        table = load_table(path)
+        kind = (table.schema.metadata or {}).get(TABLE_KIND, b"frame")
+        if kind == b"records":
+            return table.to_pylist()
+        if kind == b"mapping":
+            return {row.pop("_key"): row for row in table.to_pylist()}
+        return table.to_pandas()
+    with open(path, "rb") as file:
+        is_record_log = file.read(len(RECORD_LOG_MAGIC)) in (
+            RECORD_LOG_MAGIC,
+            MSGPACK_LOG_MAGIC,
+        )
+        if not is_record_log:
+            file.seek(0)
+            return pickle.load(file)
+    return list(_iter_log_records(path))
+
+
+def _require(name: str) -> Any:
+    # optional format dependencies (pyarrow, msgpack) are imported on first use,
+    # importing them up front would slow down every "import data"
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        package = name.split(".")[0]
+        raise ImportError(f"{package} is needed for this format, pip install {package}")
+
+
+def _save_table(obj: Any, path: str) -> None:
+    pa = _require("pyarrow")
+    if isinstance(obj, Mapping):
+        table = pa.Table.from_pylist([{"_key": k, **v} for k, v in obj.items()])
+        kind = b"mapping"
+    elif isinstance(obj, list):
+        table = pa.Table.from_pylist(obj)
+        kind = b"records"
+    else:
+        table = pa.Table.from_pandas(obj, preserve_index=False)
+        kind = b"frame"
+    _write_table(table, kind, path)
+
+
+def _write_table(table: "pa.Table", kind: bytes, path: str) -> None:
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), TABLE_KIND: kind}
+    )
+    if path.endswith(PARQUET_EXTENSIONS):
+        _require("pyarrow.parquet").write_table(table, path)
+    else:
+        pa = _require("pyarrow")
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def save_lookup_table(frame: Any, key: str, path: str) -> None:
+    """
+    save the rows of a DataFrame as a mapping table {key: {other columns}}, straight
+    from its columns, load it with data.lookup.load_lookup (or load_pickled_obj for a
+    dict)
+    later rows win over earlier ones with the same key, like in a dict
+    :param frame: pd.DataFrame
+    :param key: column of the keys
+    :param path: .arrow/.feather or .parquet path
+    :return:
+    """
+    pa = _require("pyarrow")
+    frame = frame.drop_duplicates(key, keep="last").rename(columns={key: "_key"})
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    _write_table(table, b"mapping", path)
+
+
+def load_table(path: str, columns: Sequence[str] = None) -> "pa.Table":
+    """
+    memory-map an arrow ipc file or parquet file as a pyarrow Table
+    :param path:
+    :param columns: only read these columns
+    :return:
+    """
+    pa = _require("pyarrow")
+    if path.endswith(PARQUET_EXTENSIONS):
+        pq = _require("pyarrow.parquet")
+        return pq.read_table(path, columns=columns, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table if columns is None else table.select(columns)
+
+
+def _msgpack_default(obj: Any) -> Any:
+    # ChainMap overlays and other mappings become maps, sets become arrays
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"cannot serialize {type(obj)} to msgpack")
+
+
+def _pack_frame(records: Sequence) -> bytes:
+    msgpack = _require("msgpack")
+    return msgpack.packb(list(records), default=_msgpack_default, use_bin_type=True)
+
+
+def _unpack_frame(payload: bytes) -> List:
+    msgpack = _require("msgpack")
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def _pickle_frame(records: Sequence) -> bytes:
+    return pickle.dumps(list(records), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _log_magic(path: str) -> bytes:
+    if path.endswith(MSGPACK_EXTENSIONS):
+        _require("msgpack")
+        return MSGPACK_LOG_MAGIC
+    return RECORD_LOG_MAGIC
+
+
+def _frame_codec(magic: bytes) -> Callable[[bytes], List]:
+    if magic == MSGPACK_LOG_MAGIC:
+        _require("msgpack")
+        return _unpack_frame
+    return pickle.loads
+
+
+def save_records(records: Iterable, path: str, batch_size: int = 1000) -> None:
+    """
+    write records (e.g. a generator of docs) to a record log without holding them
+    all in memory, msgpack frames for msgpack extensions, pickle frames otherwise
+    :param records:
+    :param path: record log path
+    :param batch_size: number of records per frame
+    :return:
+    """
+    if isinstance(records, Mapping):
+        raise TypeError(f"{path}: record logs store sequences of docs, not mappings")
+    for _ in tee_records(records, path, batch_size):
+        pass
+
+
+def append_records(records: Sequence, path: str) -> None:
+    """
+    append a batch of records to an append-only log as one length-prefixed frame,
+    pickle frames unless path has a msgpack extension
+    the frame is fsynced, so a crash can at most tear the frame being written
+    :param records: batch of records
+    :param path: record log path
+    :return:
+    """
+    magic = _log_magic(path)
+    with open(path, "ab") as file:
+        if file.tell() == 0:
+            file.write(magic)
+        _write_frame(file, records, magic)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _write_frame(file: BinaryIO, records: Sequence, magic: bytes) -> None:
+    if magic == MSGPACK_LOG_MAGIC:
+        payload = _pack_frame(records)
+    else:
+        payload = _pickle_frame(records)
+    file.write(FRAME_HEADER.pack(len(payload)))
+    file.write(payload)
+
+
+def repair_records(path: str) -> None:
+    """
+    truncate a torn frame at the end of a record log (left by a crash) so that the log
+    can be appended to again, frames are skipped over without being decoded
+    :param path: record log path
+    :return:
+    """
+    with open(path, "r+b") as file:
+        offset = len(RECORD_LOG_MAGIC)
+        magic = file.read(offset)
+        end = file.seek(0, os.SEEK_END)
+        if magic not in (RECORD_LOG_MAGIC, MSGPACK_LOG_MAGIC):
+            if end <= offset:
+                file.truncate(0)
+                return
+            raise ValueError(f"{path} is not a record log!")
+        file.seek(offset)
+        while True:
+            header = file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            (size,) = FRAME_HEADER.unpack(header)
+            if file.tell() + size > end:
+                break
+            offset = file.seek(size, os.SEEK_CUR)
+        file.truncate(offset)
+
+
+def load_records(path: str) -> List:
+    """
+    read all complete frames of a record log, a torn frame at the end (left by a crash)
+    is truncated so that the log can be appended to again
+    :param path: record log path
+    :return: list of records
+    """
+    repair_records(path)
+    return list(_iter_log_records(path))
+
+
+def _project(records: Iterable[Mapping], fields: Sequence[str]) -> Iterator[dict]:
+    for record in records:
+        yield {field: record[field] for field in fields if field in record}
+
+
+def _iter_table_rows(path: str, fields: Sequence[str] = None) -> Iterator[dict]:
+    pa = _require("pyarrow")
+    if path.endswith(PARQUET_EXTENSIONS):
+        pq = _require("pyarrow.parquet")
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(columns=fields)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        if fields is not None:
+            batches = (batch.select(fields) for batch in batches)
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+def iter_records(path: str, fields: Sequence[str] = None) -> Iterator:
+    """
+    stream records from disk one at a time for a single forward pass:
+    record logs are read one frame at a time (stopping at a torn frame), arrow and
+    parquet tables one record batch at a time
+    a plain pickled list (the format of older snapshots) is loaded and iterated,
+    re-save it with save_records to stream it in constant memory
+    :param path: record log, table or pickle path
+    :param fields: only keep these top level fields of each record, tables only
+    read these columns
+    :return: records
+    """
+    if path.endswith(ARROW_EXTENSIONS + PARQUET_EXTENSIONS):
+        yield from _iter_table_rows(path, fields)
+        return
+    records = _iter_log_records(path)
+    yield from records if fields is None else _project(records, fields)
+
+
+def _iter_log_records(path: str) -> Iterator:
     with open(path, "rb") as file:
-        return pickle.load(file)
+        magic = file.read(len(RECORD_LOG_MAGIC))
+        if not magic:
+            # an empty log, e.g. one truncated by repair_records
+            return
+        if magic not in (RECORD_LOG_MAGIC, MSGPACK_LOG_MAGIC):
+            file.seek(0)
+            yield from pickle.load(file)
+            return
+        loads = _frame_codec(magic)
+        while True:
+            header = file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            (size,) = FRAME_HEADER.unpack(header)
+            payload = file.read(size)
+            if len(payload) < size:
+                return
+            yield from loads(payload)
+
+
+def tee_records(records: Iterable, path: str, batch_size: int = 1000) -> Iterator:
+    """
+    pass records through while writing them to a record log as a side stream
+    the log is written to {path}.part and only moved to path once the stream is
+    exhausted, so an interrupted run never leaves a partial snapshot behind
+    :param records: records to pass through
+    :param path: record log path, msgpack frames for msgpack extensions
+    :param batch_size: number of records per frame
+    :return: records
+    """
+    magic = _log_magic(path)
+    part_path = path + ".part"
+    with open(part_path, "wb") as file:
+        file.write(magic)
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == batch_size:
+                _write_frame(file, batch, magic)
+                batch = []
+            yield record
+        if batch:
+            _write_frame(file, batch, magic)
+    os.replace(part_path, path)
+    print(f"Writing docs to {path}...")
@@ -1,36 +1,77 @@
+from typing import Dict, Iterator, List, Tuple
 from collections import defaultdict
 import pandas as pd
-from data import load_pickled_obj
+from data.lookup import load_lookup
 
 
 class ParseDiseGeneRel(object):
     """parse genes_diseases_relation.csv"""
 
-    def __init__(self, input_file, gene_file, dise_file):
+    DTYPES = {"GeneID": str, "DiseaseID": str, "pmids": str}
+
+    def __init__(
+        self,
+        input_file,
+        gene_file,
+        dise_file,
+        chunk_size=10000,
+        streaming=False,
+        usecols=None,
+    ):
+        """
+        :param input_file: relation csv
+        :param chunk_size: number of rows converted per batch
+        :param streaming: read input_file in chunks of chunk_size rows while iterating
+        instead of loading it all at once
+        :param usecols: only read these columns
+        """
         print(f"building DiseGeneRel parser...")
-        self.csv_df = pd.read_csv(input_file)
-        self.gene_mapping = load_pickled_obj(gene_file)
-        self.dise_mapping = load_pickled_obj(dise_file)
-
-    def _quick_process(self, sub_df: pd.DataFrame):
-        line_dict = sub_df.fillna("").to_dict()
-        line_dict["GeneID"] = str(line_dict["GeneID"])
-        line_dict["Gene"] = self.gene_mapping.get(str(line_dict["GeneID"]), None)
-        line_dict["Disease"] = self.dise_mapping.get(line_dict["DiseaseID"], None)
-        pmids_lst = line_dict["pmids"].split("|")
-        del line_dict["pmids"]
-        return line_dict, pmids_lst
+        self.input_file = input_file
+        self.usecols = usecols
+        self.csv_df = (
+            None
+            if streaming
+            else pd.read_csv(input_file, dtype=self.DTYPES, usecols=usecols)
+        )
+        self.gene_lookup = load_lookup(gene_file)
+        self.dise_lookup = load_lookup(dise_file)
+        self.chunk_size = chunk_size
+
+    def _batch_process(self, sub_df: pd.DataFrame) -> Iterator[Tuple[Dict, List[str]]]:
+        sub_df = sub_df.fillna("")
+        sub_df["GeneID"] = sub_df["GeneID"].astype(str)
+        gene = self.gene_lookup.map(sub_df["GeneID"])
+        sub_df["Gene"] = gene.where(gene.notna(), None)
+        disease = self.dise_lookup.map(sub_df["DiseaseID"])
+        sub_df["Disease"] = disease.where(disease.notna(), None)
+        pmids_lsts = sub_df.pop("pmids").str.split("|").tolist()
+        return zip(sub_df.to_dict("records"), pmids_lsts)
+
+    def _iter_chunks(self) -> Iterator[pd.DataFrame]:
+        if self.csv_df is not None:
+            for start in range(0, len(self.csv_df), self.chunk_size):
+                yield self.csv_df.iloc[start : start + self.chunk_size]
+        else:
+            yield from pd.read_csv(
+                self.input_file,
+                chunksize=self.chunk_size,
+                dtype=self.DTYPES,
+                usecols=self.usecols,
+            )
 
     def __iter__(self):
-        for line in self.csv_df.iloc:
-            yield self._quick_process(line)
+        for chunk in self._iter_chunks():
+            yield from self._batch_process(chunk)
 
     def get_gene_dise_dist(self):
+        names = self.dise_lookup.column("DiseaseName")
         dist = defaultdict(set)
-        for line in self.csv_df.iloc:
-            dist[str(line.GeneID)].add(
-                self.dise_mapping.get(line.DiseaseID, line.DiseaseID)["DiseaseName"]
-            )
+        for chunk in self._iter_chunks():
+            dise_names = chunk["DiseaseID"].map(names)
+            dise_names = dise_names.where(dise_names.notna(), chunk["DiseaseID"])
+            genes = chunk["GeneID"].astype(str)
+            for gene, dises in dise_names.groupby(genes.values).agg(set).items():
+                dist[gene] |= dises
         return dist
 
 
@@ -1,22 +1,41 @@
-import json
 from os import listdir, path
+from functools import partial
+from collections import Counter
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, Optional, Sequence
+from data.json_backend import load_json
+
+# fields of parse_json_summary, in the column order of the compacted metadata
+SUMMARY_FIELDS = (
+    "institutions",
+    "countries",
+    "json_authors",
+    "sections_count",
+    "bibs_count",
+    "figures_count",
+    "tables_count",
+)
 
 
 class ParseJsonDoc(object):
-    def __init__(self, file_dir, json_name):
+    # only the keys read by _parse_meta
+    KEYS = ("metadata/authors",)
+    # the keys read by summarize
+    SUMMARY_KEYS = ("metadata/authors", "body_text", "bib_entries", "ref_entries")
+
+    def __init__(self, file_dir, json_name, keys: Optional[Sequence[str]] = KEYS):
         """
         parse individual json doc
         :param file_dir:
         :param json_name:
+        :param keys: key paths to keep (see json_backend.load_json), None for all
         """
         self.fields = {}
         try:
             if json_name.endswith(".json"):
-                with open(path.join(file_dir, json_name), "r") as f:
-                    self.doc = json.load(f)
+                self.doc = load_json(path.join(file_dir, json_name), keys)
             else:
-                with open(path.join(file_dir, json_name) + ".json", "r") as f:
-                    self.doc = json.load(f)
+                self.doc = load_json(path.join(file_dir, json_name) + ".json", keys)
         except FileNotFoundError:
             pass
         else:
@@ -50,23 +69,87 @@ class ParseJsonDoc(object):
 
     # TODO: add more parsable fields
 
+    def summarize(self):
+        """
+        add author names and the section/bib/ref counts (as JsonInspector reports
+        them) to the fields, the doc has to be loaded with SUMMARY_KEYS
+        :return:
+        """
+        self._inspect_authors()
+        self._inspect_body_text()
+        self._inspect_bib()
+        self._inspect_ref()
+
+    def _inspect_authors(self):
+        authors = self.doc["metadata"]["authors"]
+        self.fields["json_authors"] = [
+            " ".join(name for name in (au.get("first"), au.get("last")) if name)
+            for au in authors
+        ]
+
     def _inspect_body_text(self):
-        # TODO:
         body_t = self.doc["body_text"]
+        self.fields["sections_count"] = len(dict.fromkeys(b["section"] for b in body_t))
 
     def _inspect_bib(self):
-        # TODO:
         bibs = self.doc["bib_entries"]
+        self.fields["bibs_count"] = len(bibs)
 
     def _inspect_ref(self):
-        # TODO:
         refs = self.doc["ref_entries"]
+        ref_counter = Counter({"figure": 0, "table": 0})
+        ref_counter.update(refs[k]["type"] for k in refs)
+        for k in ref_counter:
+            self.fields[f"{k}s_count"] = ref_counter[k]
 
     def _inspect_abstract(self):
         # TODO:
         abstract = self.doc["abstract"]
 
 
+def parse_json_fields(file_dir: str, json_name: str) -> Dict:
+    """
+    parse one json doc and only keep the extracted fields, so that workers send back
+    a small dict instead of the whole paper
+    """
+    return ParseJsonDoc(file_dir, json_name).fields
+
+
+def parse_json_summary(file_dir: str, json_name: str) -> Dict:
+    """
+    parse one json doc into its fields plus the summary of ParseJsonDoc.summarize
+    """
+    doc = ParseJsonDoc(file_dir, json_name, keys=ParseJsonDoc.SUMMARY_KEYS)
+    if doc.fields:
+        doc.summarize()
+    return doc.fields
+
+
+def iter_json_fields(
+    file_dir: str,
+    json_names: Sequence[str],
+    workers: int = 4,
+    chunk_size: int = 64,
+    parse: Callable[[str, str], Dict] = parse_json_fields,
+) -> Iterator[Dict]:
+    """
+    parse json docs with a pool of worker processes, fields are yielded in the order
+    of json_names
+    :param file_dir:
+    :param json_names:
+    :param workers: number of worker processes, 1 to parse in this process
+    :param chunk_size: number of docs sent to a worker at once
+    :param parse: parse_json_fields or parse_json_summary
+    :return:
+    """
+    if workers <= 1:
+        for json_name in json_names:
+            yield parse(file_dir, json_name)
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap(partial(parse, file_dir), json_names, chunksize=chunk_size)
+
+
 if __name__ == "__main__":
     # for testing
     for p in listdir("../raw_data/comm_use_subset"):
@@ -0,0 +1,66 @@
+import json
+import hashlib
+from collections import Counter
+from typing import Any, Dict, Mapping
+
+
+def _encode(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, default=_canonical)
+
+
+def _canonical(obj: Any) -> Any:
+    # sets are hashed in sorted order, their iteration order changes with the hash seed
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=_encode)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return str(obj)
+
+
+def content_hash(obj: Any) -> str:
+    """
+    hash of the json encoding of obj (keys and sets sorted), equal for equal content
+    lists keep their order, build them in a deterministic one (not from a set)
+    :param obj: json serializable object, anything else is encoded with str
+    :return: hex digest
+    """
+    encoded = _encode(obj)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def stable_doc_id(*parts: Any) -> str:
+    """
+    doc id derived from the identifying fields of a doc instead of its position,
+    so that inserting or dropping an upstream row leaves the ids of the others alone
+    :param parts: e.g. cord_uid, sha and pubmed_id of a paper
+    :return:
+    """
+    return content_hash(parts)
+
+
+class NumberedIds(object):
+    def __init__(self):
+        """
+        stable_doc_id of a stream of docs, repeats of the same parts are numbered in
+        the order they come in (-1, -2, ...), so that every source row keeps its own doc
+        instead of overwriting the one with the same id
+        """
+        self.counts = Counter()
+
+    def __call__(self, *parts: Any) -> str:
+        digest = stable_doc_id(*parts)
+        repeat = self.counts[digest]
+        self.counts[digest] += 1
+        return digest if repeat == 0 else f"{digest}-{repeat}"
+
+
+class EvidenceIds(NumberedIds):
+    """
+    stable doc ids of ppi evidence records: the pmid and a hash of the record
+    without its evi_ents (which depend on the NER model), repeats of the same
+    evidence are numbered
+    """
+
+    def __call__(self, pmid: str, record: Dict) -> str:
+        record = {key: value for key, value in record.items() if key != "evi_ents"}
+        return f"{pmid}-{super().__call__(pmid, record)}"
@@ -0,0 +1,132 @@
+import re
+import json
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# full loads are decoded by orjson (or json), selective loads (keys=) by simdjson,
+# which only materializes the requested subtrees; without simdjson they fall back to
+# a full decode followed by picking out the keys
+FULL_BACKEND = "json" if orjson is None else "orjson"
+if simdjson is not None:
+    SELECT_BACKEND = "simdjson"
+    _parser = simdjson.Parser()
+else:
+    SELECT_BACKEND = FULL_BACKEND
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _to_python(node: Any) -> Any:
+    if isinstance(node, simdjson.Object):
+        return node.as_dict()
+    if isinstance(node, simdjson.Array):
+        return node.as_list()
+    return node
+
+
+def _select(doc: Any, keys: Sequence[str], to_python=lambda node: node) -> Dict:
+    """
+    copy the given "/"-separated key paths of doc into a new nested dict,
+    missing paths are left out
+    """
+    selected = {}
+    for key_path in keys:
+        parts = key_path.split("/")
+        node = doc
+        try:
+            for part in parts:
+                node = node[part]
+        except KeyError:
+            continue
+        target = selected
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = to_python(node)
+    return selected
+
+
+def load_json(file_path: str, keys: Optional[Sequence[str]] = None) -> Dict:
+    """
+    load a json file, with FULL_BACKEND or (given keys) SELECT_BACKEND
+    :param file_path:
+    :param keys: only return these "/"-separated key paths, e.g. ["metadata/authors"],
+    the result keeps their nesting ({"metadata": {"authors": [...]}}), None for all
+    only simdjson skips decoding the rest of the file, the other backends decode it all
+    :return:
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    if keys is None:
+        return loads(data)
+    if simdjson is not None:
+        # simdjson only materializes the requested subtrees
+        return _select(_parser.parse(data), keys, _to_python)
+    return _select(loads(data), keys)
+
+
+# whitespace and the commas between the items of an array
+_ITEM_SEPARATOR = re.compile(r"[\s,]*")
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(file_path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """
+    lazily decode the items of a top level json array one at a time, the whole
+    file is never held in memory
+    ijson is used if installed, otherwise the file is read chunk_size characters at a
+    time and each item is decoded from the buffer as soon as it is complete
+    :param file_path:
+    :param chunk_size:
+    :return: array items
+    """
+    if ijson is not None:
+        with open(file_path, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+        return
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{file_path} does not hold a json array!")
+        pos = 1
+        eof = False
+        while True:
+            pos = _ITEM_SEPARATOR.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                end = _WHITESPACE.match(buffer, end).end()
+            except json.JSONDecodeError:
+                end = None
+            # an item is only complete once the "," or "]" after it is in the buffer,
+            # until then it may be cut off (e.g. "2" of "2.5" or "1e" of "1e5")
+            if end is None or not buffer.startswith((",", "]"), end):
+                if eof:
+                    raise ValueError(f"{file_path} is not a complete json array!")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+            pos = end
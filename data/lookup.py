@@ -0,0 +1,81 @@
+from typing import Any, Dict, List, Sequence
+import numpy as np
+import pandas as pd
+from data.data_io import (
+    ARROW_EXTENSIONS,
+    PARQUET_EXTENSIONS,
+    load_pickled_obj,
+    load_table,
+)
+
+
+class Lookup(object):
+    def __init__(self, keys: Sequence[str], values: Any):
+        """
+        an id mapping {key: {column: value}} kept column-wise, the row dict of a key is
+        only built once the key is looked up (and then shared by all of its hits)
+        :param keys:
+        :param values: pyarrow Table of the value columns (memory-mapped), or the list
+        of value dicts of a pickled mapping, in the order of keys
+        """
+        self.keys = pd.Index(keys)
+        self.values = values
+        self._rows: Dict[int, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _take(self, positions: List[int]) -> List[Dict]:
+        missing = [p for p in dict.fromkeys(positions) if p not in self._rows]
+        if missing:
+            if isinstance(self.values, list):
+                rows = [self.values[p] for p in missing]
+            else:
+                rows = self.values.take(missing).to_pylist()
+            self._rows.update(zip(missing, rows))
+        return [self._rows[p] for p in positions]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            position = self.keys.get_loc(key)
+        except KeyError:
+            return default
+        return self._take([position])[0]
+
+    def map(self, keys: pd.Series) -> pd.Series:
+        """
+        like keys.map(mapping): the row dict of each key, NaN for unknown keys
+        """
+        positions = self.keys.get_indexer(keys)
+        hit = positions >= 0
+        rows = np.empty(hit.sum(), dtype=object)
+        rows[:] = self._take(positions[hit].tolist())
+        values = np.full(len(positions), np.nan, dtype=object)
+        values[hit] = rows
+        return pd.Series(values, index=keys.index)
+
+    def column(self, name: str) -> pd.Series:
+        """
+        one value column indexed by key, without building any row dict
+        """
+        if isinstance(self.values, list):
+            column = [row[name] for row in self.values]
+        else:
+            column = self.values.column(name).to_pylist()
+        return pd.Series(column, index=self.keys, dtype=object)
+
+
+def load_lookup(path: str) -> Lookup:
+    """
+    a mapping saved by pickle_obj_mapping or save_lookup_table as a Lookup
+    arrow/parquet tables are memory-mapped, only their key column is read up front
+    :param path:
+    :return:
+    """
+    if path.endswith(ARROW_EXTENSIONS + PARQUET_EXTENSIONS):
+        table = load_table(path)
+        keys = table.column("_key").to_pylist()
+        values = table.select([name for name in table.column_names if name != "_key"])
+        return Lookup(keys, values)
+    mapping = load_pickled_obj(path)
+    return Lookup(list(mapping), list(mapping.values()))
@@ -1,34 +1,44 @@
-from typing import Sequence, Dict
-from string import digits, ascii_lowercase, ascii_uppercase
+import re
+from typing import Sequence, Dict, Iterable, List, Optional, Tuple
+import pandas as pd
 
 
 class ParseMetaData(object):
+    # publish_time formats: "2020", "2020-01-31" and "2020 Jan" (optionally followed by
+    # a day, "2020 Jan 31", or anything else)
+    DATE_PATTERN = re.compile(
+        r"^(?P<year>[0-9]{4})(?:$"
+        r"|-(?P<month>[0-9]{2})-(?P<day>[0-9]{2})$"
+        r"| (?P<month_abbr>[A-Z][a-z]{2})"
+        r"(?:[a-z]*\.? (?P<abbr_day>[0-9]{1,2})(?![0-9]))?)"
+    )
+    DATE_ABBR = dict(
+        zip(
+            [
+                "Jan",
+                "Feb",
+                "Mar",
+                "Apr",
+                "May",
+                "Jun",
+                "Jul",
+                "Aug",
+                "Sep",
+                "Oct",
+                "Nov",
+                "Dec",
+            ],
+            [str(n) if n > 9 else "0" + str(n) for n in range(1, 13)],
+        )
+    )
+
     def __init__(self):
         """
         parse/clean/modify fields of each line from meta csv
         create new additional fields before generate ES Index
+        use parse_frame to parse a whole meta DataFrame at once
         """
         self.meta_dict = None
-        self._get_word_shape_mapping()
-        self.DATE_ABBR = dict(
-            zip(
-                [
-                    "Jan",
-                    "Feb",
-                    "Mar",
-                    "Apr",
-                    "May",
-                    "Jun",
-                    "Jul",
-                    "Aug",
-                    "Sep",
-                    "Oct",
-                    "Nov",
-                    "Dec",
-                ],
-                [str(n) if n > 9 else "0" + str(n) for n in range(1, 13)],
-            )
-        )
 
     def _parse_authors(self) -> None:
         """
@@ -42,11 +52,9 @@ class ParseMetaData(object):
             self.meta_dict["authors"] = None
             self.meta_dict["authors_full"] = None
             return
-        authors = authors.split(";")
-        authors_split = [self._split_name(author.split(", ")) for author in authors]
-        authors_full = [" ".join(author.split(", ")[::-1]) for author in authors]
-        self.meta_dict["authors"] = authors_split
-        self.meta_dict["authors_full"] = authors_full
+        names = [author.split(", ") for author in authors.split(";")]
+        self.meta_dict["authors"] = [self._split_name(name) for name in names]
+        self.meta_dict["authors_full"] = [" ".join(name[::-1]) for name in names]
 
     @staticmethod
     def _split_name(name: Sequence) -> Dict[str, str]:
@@ -55,52 +63,149 @@ class ParseMetaData(object):
         else:
             return {"last_name": name[0], "first_name": None}
 
+    @staticmethod
+    def _date_fields(
+        year: Optional[str], month: Optional[str], day: Optional[str]
+    ) -> Tuple[Optional[Dict], Optional[str]]:
+        if year is None:
+            return None, None
+        publish_time = {"year": year, "month": month, "day": day}
+        # es_date defaults to the first month/day (match es original date format)
+        return publish_time, "-".join([year, month or "01", day or "01"])
+
     def _parse_date(self) -> None:
         """
         get date-related fields:
-        publish_time = {'year': '2020', 'month': '01'}
-        es_date = '2020-01' (match es original date format)
+        publish_time = {'year': '2020', 'month': '01', 'day': '31'}
+        es_date = '2020-01-31' (match es original date format)
+        dates in other formats are left out like missing ones
         :return:
         """
-        # TODO: get full date (year, month, day)
         date = self.meta_dict.get("publish_time")
-        if not date:
-            self.meta_dict["publish_time"] = None
-            self.meta_dict["es_date"] = None
-            return
-        date_shape = "".join(self.WORD_SHAPE_MAPPING[d] for d in date)
-        if date_shape == "dddd":
-            date = {"year": date, "month": None}
-        elif date_shape == "dddd-dd-dd":
-            date = {"year": date[:4], "month": date[5:7]}
-        elif date_shape.startswith("dddd Ccc"):
-            date = {"year": date[:4], "month": self.DATE_ABBR.get(date[5:8], None)}
-        self.meta_dict["publish_time"] = date
-        year = self.meta_dict["publish_time"]["year"]
-        month = self.meta_dict["publish_time"]["month"]
-        # set default value (2020-01-01) for es_date field
-        if not year:
-            year = "2020"
-        if not month:
-            month = "01"
-        self.meta_dict["es_date"] = "-".join([year, month, "01"])
-
-    def _get_word_shape_mapping(self) -> None:
-        """
-        utility for processing date
-        :return:
-        """
-        self.WORD_SHAPE_MAPPING = {}
-        self.WORD_SHAPE_MAPPING.update(zip(digits, len(digits) * "d"))
-        self.WORD_SHAPE_MAPPING.update(zip(ascii_lowercase, len(ascii_lowercase) * "c"))
-        self.WORD_SHAPE_MAPPING.update(zip(ascii_uppercase, len(ascii_uppercase) * "C"))
-        self.WORD_SHAPE_MAPPING.update({" ": " ", "-": "-"})
+        match = self.DATE_PATTERN.match(date) if date else None
+        if match is None:
+            year = month = day = None
+        else:
+            year = match["year"]
+            month = match["month"] or self.DATE_ABBR.get(match["month_abbr"])
+            day = match["day"] or (match["abbr_day"] and match["abbr_day"].zfill(2))
+        publish_time, es_date = self._date_fields(year, month, day)
+        self.meta_dict["publish_time"] = publish_time
+        self.meta_dict["es_date"] = es_date
 
     def __call__(self, meta_dict: Dict):
         self.meta_dict = meta_dict
         self._parse_authors()
         self._parse_date()
 
+    @staticmethod
+    def _to_python(values: pd.Series) -> List:
+        # NaN -> None
+        return values.astype(object).where(values.notna(), None).tolist()
+
+    def _parse_date_column(self, dates: pd.Series) -> Tuple[List, List]:
+        parts = dates.fillna("").astype(str).str.extract(self.DATE_PATTERN)
+        month = parts["month"].fillna(parts["month_abbr"].map(self.DATE_ABBR))
+        day = parts["day"].fillna(parts["abbr_day"].str.zfill(2))
+        fields = [
+            self._date_fields(*date)
+            for date in zip(
+                self._to_python(parts["year"]),
+                self._to_python(month),
+                self._to_python(day),
+            )
+        ]
+        return [field[0] for field in fields], [field[1] for field in fields]
+
+    def _parse_authors_column(self, authors: pd.Series) -> Tuple[List, List]:
+        authors = authors.fillna("").astype(str)
+        names = authors[authors != ""].str.split(";").explode().str.split(", ")
+        last_names = self._to_python(names.str[0])
+        first_names = self._to_python(names.str[1])
+        full_names = names.str[::-1].str.join(" ").tolist()
+        authors_split, authors_full = [], []
+        start = 0
+        for count in authors.str.count(";").add(1).where(authors != "", 0):
+            end = start + count
+            if count:
+                authors_split.append(
+                    [
+                        {"last_name": last_name, "first_name": first_name}
+                        for last_name, first_name in zip(
+                            last_names[start:end], first_names[start:end]
+                        )
+                    ]
+                )
+                authors_full.append(full_names[start:end])
+            else:
+                authors_split.append(None)
+                authors_full.append(None)
+            start = end
+        return authors_split, authors_full
+
+    def parse_frame(self, meta_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        batch version of __call__, parse the publish_time and authors columns of a
+        whole meta DataFrame with vectorized string ops, the other columns are kept
+        :param meta_df: meta csv rows
+        :return: a copy of meta_df with publish_time, es_date, authors and authors_full
+        """
+        meta_df = meta_df.copy()
+        empty = pd.Series("", index=meta_df.index)
+        columns = {}
+        columns["publish_time"], columns["es_date"] = self._parse_date_column(
+            meta_df.get("publish_time", empty)
+        )
+        columns["authors"], columns["authors_full"] = self._parse_authors_column(
+            meta_df.get("authors", empty)
+        )
+        for column, values in columns.items():
+            meta_df[column] = pd.Series(values, index=meta_df.index, dtype=object)
+        return meta_df
+
+
+class MetaByPmid(object):
+    def __init__(
+        self, meta_data: Iterable[Dict], meta_parser: Optional[ParseMetaData] = None
+    ):
+        """
+        normalized metadata by pubmed_id, each paper's metadata is parsed once on first
+        use and the result is shared by all the docs built from that paper, so it must
+        not be modified (overlay it, e.g. ChainMap(doc, meta_by_pmid[pmid]))
+        papers missing from meta_data get the fields of an empty meta dict
+        :param meta_data: meta dicts, e.g. iter_records("raw_data/sub_metadata.pkl")
+        :param meta_parser:
+        """
+        self.meta_parser = meta_parser or ParseMetaData()
+        self.raw_meta = {item["pubmed_id"]: item for item in meta_data}
+        self.parsed_meta = {}
+
+    def __getitem__(self, pmid: str) -> Dict:
+        meta_dict = self.parsed_meta.get(pmid)
+        if meta_dict is None:
+            # the raw meta is not needed anymore once parsed
+            meta_dict = dict(self.raw_meta.pop(pmid, {}))
+            self.meta_parser(meta_dict)
+            self.parsed_meta[pmid] = meta_dict
+        return meta_dict
+
+
+def load_compact_meta(
+    parquet_file: str, columns: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    """
+    load the (memory-mapped) parquet written by script/compact_cord19.py
+    :param parquet_file:
+    :param columns: only load these columns
+    :return:
+    """
+    return pd.read_parquet(
+        parquet_file,
+        engine="pyarrow",
+        columns=None if columns is None else list(columns),
+        memory_map=True,
+    )
+
 
 if __name__ == "__main__":
     pass
@@ -0,0 +1,123 @@
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Any, Dict, List, Optional
+from collections import defaultdict
+from data.spacy_model import LazySpacyModel
+
+
+def get_model_name(spacy_model: Any) -> str:
+    """
+    package name of a loaded spaCy model, e.g. en_ner_bionlp13cg_md
+    :param spacy_model: a loaded model or a LazySpacyModel (which is not loaded)
+    :return:
+    """
+    if isinstance(spacy_model, LazySpacyModel):
+        return spacy_model.model_name
+    meta = spacy_model.meta
+    return f"{meta['lang']}_{meta['name']}"
+
+
+class NERCache(object):
+    def __init__(
+        self,
+        db_path: str,
+        model_name: str,
+        model_version: str,
+        max_entries: int = 2000000,
+        flush_every: int = 5000,
+    ):
+        """
+        persistent content-addressed cache of evi_ents dicts
+        entries are keyed by a hash of the text and the spaCy model name/version,
+        the least recently used ones are evicted once max_entries is exceeded
+        :param db_path: sqlite file, e.g. raw_data/ner_cache.sqlite
+        :param model_name: spaCy model name
+        :param model_version: spaCy model version
+        :param max_entries: size cap of the cache
+        :param flush_every: number of pending writes before they are committed
+        """
+        self.db_path = db_path
+        self.model_name = model_name
+        self.model_version = model_version
+        self.model_key = f"{model_name}=={model_version}"
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._pending_puts = []
+        self._pending_touches = []
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ents "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ents_lru ON ents (last_used)")
+        self.conn.commit()
+
+    @classmethod
+    def for_model(cls, db_path: str, spacy_model: Any, **kwargs) -> "NERCache":
+        if isinstance(spacy_model, LazySpacyModel):
+            model_version = spacy_model.model_version
+        else:
+            model_version = spacy_model.meta["version"]
+        return cls(db_path, get_model_name(spacy_model), model_version, **kwargs)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_key}\n{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[Dict[str, List[str]]]:
+        key = self._key(text)
+        row = self.conn.execute("SELECT value FROM ents WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pending_touches.append((time.time(), key))
+        self._maybe_flush()
+        return defaultdict(list, json.loads(row[0]))
+
+    def put(self, text: str, ents: Dict[str, List[str]]) -> None:
+        self._pending_puts.append((self._key(text), json.dumps(ents), time.time()))
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if len(self._pending_puts) + len(self._pending_touches) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO ents (key, value, last_used) VALUES (?, ?, ?)",
+            self._pending_puts,
+        )
+        self.conn.executemany(
+            "UPDATE ents SET last_used = ? WHERE key = ?", self._pending_touches
+        )
+        self.conn.commit()
+        self._pending_puts = []
+        self._pending_touches = []
+        self._evict()
+
+    def _evict(self) -> None:
+        (size,) = self.conn.execute("SELECT COUNT(*) FROM ents").fetchone()
+        if size <= self.max_entries:
+            return
+        self.conn.execute(
+            "DELETE FROM ents WHERE key IN "
+            "(SELECT key FROM ents ORDER BY last_used LIMIT ?)",
+            (size - self.max_entries,),
+        )
+        self.conn.commit()
+
+    def report(self) -> None:
+        total = self.hits + self.misses
+        rate = round(100 * self.hits / total, 2) if total else 0.0
+        print(
+            f"NER cache {self.db_path}: {self.hits} hits, {self.misses} misses ({rate}% hit rate)"
+        )
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
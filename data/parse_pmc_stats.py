@@ -1,11 +1,29 @@
+import sys
+import json
 import attr
-from typing import Tuple, Optional, List, Any
+from itertools import islice, chain
+from collections import deque, OrderedDict
+from multiprocessing import Pool
+from typing import (
+    Tuple,
+    Optional,
+    List,
+    Any,
+    Callable,
+    Dict,
+    DefaultDict,
+    Iterable,
+    Iterator,
+)
 from collections import defaultdict
-from indra.tools import assemble_corpus as ac
-from indra.statements.statements import stmts_from_json_file
-from indra.statements import Statement
 from data import pickle_obj_mapping, load_pickled_obj
-import spacy
+from data.ner_cache import NERCache, get_model_name
+from data.json_backend import iter_json_array
+from data.spacy_model import LazySpacyModel
+
+# evi_ents placeholder of a text whose first copy is still going through the model,
+# compared by value: with n_process > 1 the context comes back from nlp.pipe pickled
+_PENDING = "__pending__"
 
 
 @attr.s()
@@ -14,11 +32,126 @@ class Relation:
     rel: str = attr.ib()
 
 
+@attr.s(auto_attribs=True)
+class JsonStmtStream:
+    """
+    re-iterable INDRA statements of a json file, each pass decodes the top level
+    array incrementally and builds the Statement objects one at a time
+    (supports/supported_by links between statements are not resolved)
+    """
+
+    input_json: str = attr.ib()
+
+    def __iter__(self) -> Iterator["Statement"]:
+        from indra.statements import Statement
+
+        for stmt_json in iter_json_array(self.input_json):
+            stmt = Statement._from_json(stmt_json)
+            if stmt is not None:
+                yield stmt
+
+
+class LiteAgent(object):
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class LiteEvidence(object):
+    __slots__ = ("pmid", "text")
+
+    def __init__(self, pmid: Optional[str], text: Optional[str]):
+        self.pmid = pmid
+        self.text = text
+
+
+class LiteStmt(object):
+    """
+    the parts of an INDRA statement ParsePMCStmts reads: type, agents and the
+    pmid/text of each evidence, read straight from the statement json
+    """
+
+    __slots__ = ("rel_type", "agents", "evidence")
+    # agent fields of the statement json in Statement.agent_list() order,
+    # Modification types not listed here have ("enz", "sub")
+    AGENT_KEYS = {
+        "Activation": ("subj", "obj"),
+        "Inhibition": ("subj", "obj"),
+        "IncreaseAmount": ("subj", "obj"),
+        "DecreaseAmount": ("subj", "obj"),
+        "Autophosphorylation": ("enz",),
+        "Translocation": ("agent",),
+        "Complex": "members",
+    }
+
+    def __init__(
+        self,
+        rel_type: str,
+        agents: List[Optional[LiteAgent]],
+        evidence: List[LiteEvidence],
+    ):
+        self.rel_type = rel_type
+        self.agents = agents
+        self.evidence = evidence
+
+    def agent_list(self) -> List[Optional[LiteAgent]]:
+        return self.agents
+
+    @staticmethod
+    def _to_agent(agent_json: Optional[Dict]) -> Optional[LiteAgent]:
+        return LiteAgent(agent_json["name"]) if agent_json else None
+
+    @classmethod
+    def from_json(cls, stmt_json: Dict) -> "LiteStmt":
+        rel_type = sys.intern(stmt_json["type"])
+        agent_keys = cls.AGENT_KEYS.get(rel_type)
+        if agent_keys is None and ParsePMCStmts.META_REL_TYPES.get(rel_type) is None:
+            # a type outside META_REL_TYPES, let INDRA work out its agents
+            from indra.statements import Statement
+
+            agents = Statement._from_json(stmt_json).agent_list()
+            agents = [LiteAgent(agent.name) if agent else None for agent in agents]
+        elif agent_keys == "members":
+            agents = [cls._to_agent(member) for member in stmt_json.get("members", [])]
+        else:
+            agent_keys = agent_keys or ("enz", "sub")
+            agents = [cls._to_agent(stmt_json.get(key)) for key in agent_keys]
+        evidence = [
+            LiteEvidence(evi.get("pmid"), evi.get("text"))
+            for evi in stmt_json.get("evidence", [])
+        ]
+        return cls(rel_type, agents, evidence)
+
+
+@attr.s(auto_attribs=True)
+class LiteStmtStream:
+    """
+    re-iterable LiteStmts of a statements json file, decoded one at a time
+    """
+
+    input_json: str = attr.ib()
+
+    def __iter__(self) -> Iterator[LiteStmt]:
+        for stmt_json in iter_json_array(self.input_json):
+            yield LiteStmt.from_json(stmt_json)
+
+
 @attr.s(auto_attribs=True)
 class ParsePMCStmts:
-    stmts: List["Statement"] = attr.ib()
+    stmts: Iterable["Statement"] = attr.ib()
     spacy_model: Any = attr.ib(None)
     UNK_PMID: str = attr.ib("UNK_PMID")
+    ner_batch_size: int = attr.ib(256)
+    ner_n_process: int = attr.ib(1)
+    ner_cache: Optional[NERCache] = attr.ib(None)
+    shard_workers: int = attr.ib(1)
+    shard_size: int = attr.ib(1000)
+    ner_memo_size: int = attr.ib(50000)
+    # in-process LRU memo of text -> json encoded evi_ents, in front of ner_cache
+    _ner_memo: "OrderedDict[str, str]" = attr.ib(
+        factory=OrderedDict, init=False, repr=False
+    )
     Modification: str = "Modification"
     RegulateActivity: str = "RegulateActivity"
     Other: str = "Other"
@@ -55,20 +188,48 @@ class ParsePMCStmts:
 
     @classmethod
     def from_pkl(
-        cls, input_pkl: str, *, spacy_model=None, unk_pmid="UNK_PMID"
+        cls, input_pkl: str, *, spacy_model=None, unk_pmid="UNK_PMID", **ner_options
     ) -> "ParsePMCStmts":
+        from indra.tools import assemble_corpus as ac
+
         stmts = ac.load_statements(input_pkl)
-        return ParsePMCStmts(stmts, spacy_model, unk_pmid)
+        return ParsePMCStmts(stmts, spacy_model, unk_pmid, **ner_options)
 
     @classmethod
     def from_json(
-        cls, input_json: str, *, spacy_model=None, unk_pmid="UNK_PMID"
+        cls, input_json: str, *, spacy_model=None, unk_pmid="UNK_PMID", **ner_options
     ) -> "ParsePMCStmts":
+        from indra.statements.statements import stmts_from_json_file
+
         stmts = stmts_from_json_file(input_json)
-        return ParsePMCStmts(stmts, spacy_model, unk_pmid)
+        return ParsePMCStmts(stmts, spacy_model, unk_pmid, **ner_options)
+
+    @classmethod
+    def from_json_stream(
+        cls, input_json: str, *, spacy_model=None, unk_pmid="UNK_PMID", **ner_options
+    ) -> "ParsePMCStmts":
+        """
+        like from_json, but statements are parsed lazily on every pass over stmts,
+        so the evidence and pmid passes start right away with flat memory
+        """
+        stmts = JsonStmtStream(input_json)
+        return ParsePMCStmts(stmts, spacy_model, unk_pmid, **ner_options)
+
+    @classmethod
+    def from_json_lite(
+        cls, input_json: str, *, spacy_model=None, unk_pmid="UNK_PMID", **ner_options
+    ) -> "ParsePMCStmts":
+        """
+        like from_json_stream, but statements are read into LiteStmts without
+        building INDRA objects (or importing indra)
+        """
+        stmts = LiteStmtStream(input_json)
+        return ParsePMCStmts(stmts, spacy_model, unk_pmid, **ner_options)
 
     @staticmethod
     def _get_rel_type(stmt: "Statement") -> str:
+        if isinstance(stmt, LiteStmt):
+            return stmt.rel_type
         return type(stmt).__name__
 
     def _get_agent_types(self, meta_rel_type: str) -> Tuple[str, str]:
@@ -98,23 +259,149 @@ class ParsePMCStmts:
         else:
             return rel_type
 
-    def _get_ents(self, text: str):
-        if not text:
-            return defaultdict(list)
-        doc = self.spacy_model(text)
-        ents = doc.ents
+    @staticmethod
+    def _ents_to_dict(ents) -> DefaultDict[str, List[str]]:
         ents_dict = defaultdict(list)
         for ent in ents:
-            ents_dict[ent.label_].append(ent.text)
-            ents_dict["all"].append(ent.text)
+            # a handful of labels is repeated over every record, entity texts are
+            # interned like the ones decoded from the memo, see _canonical_ents
+            text = sys.intern(ent.text)
+            ents_dict[sys.intern(ent.label_)].append(text)
+            ents_dict["all"].append(text)
+        return ents_dict
+
+    @staticmethod
+    def _canonical_ents(ents_dict: Dict[str, List[str]]) -> DefaultDict[str, List[str]]:
+        """
+        evi_ents with interned labels and entity texts, whether they were computed,
+        decoded from the memo or cache, or unpickled from a shard, so that equal strings
+        are always the same object and a run pickles to the same bytes either way
+        """
+        return defaultdict(
+            list,
+            {
+                sys.intern(label): [sys.intern(ent) for ent in ents]
+                for label, ents in ents_dict.items()
+            },
+        )
+
+    def _lookup_ents(self, text: str) -> Optional[DefaultDict[str, List[str]]]:
+        """
+        evi_ents of text from the in-process memo or the NER cache, None if the text
+        still has to go through the model
+        """
+        if not text:
+            return defaultdict(list)
+        encoded = self._ner_memo.get(text)
+        if encoded is not None:
+            self._ner_memo.move_to_end(text)
+            ents_dict = json.loads(encoded)
+        elif self.ner_cache is not None:
+            ents_dict = self.ner_cache.get(text)
+            if ents_dict is None:
+                return None
+            self._memoize_ents(text, ents_dict)
+        else:
+            return None
+        return self._canonical_ents(ents_dict)
+
+    def _memoize_ents(self, text: str, ents_dict: Dict[str, List[str]]) -> None:
+        # entries are kept json encoded, so that every hit gets its own fresh dict
+        self._ner_memo[text] = json.dumps(ents_dict)
+        if len(self._ner_memo) > self.ner_memo_size:
+            self._ner_memo.popitem(last=False)
+
+    def _store_ents(self, text: str, ents_dict: DefaultDict[str, List[str]]) -> None:
+        if not text:
+            return
+        self._memoize_ents(text, ents_dict)
+        if self.ner_cache is not None:
+            self.ner_cache.put(text, ents_dict)
+
+    def _model(self, text: str) -> Any:
+        if self.spacy_model is None:
+            raise ValueError(
+                f"{text!r} is neither memoized nor cached and there is no spacy_model"
+            )
+        return self.spacy_model
+
+    def _get_ents(self, text: str):
+        ents_dict = self._lookup_ents(text)
+        if ents_dict is None:
+            doc = self._model(text)(text)
+            ents_dict = self._ents_to_dict(doc.ents)
+            self._store_ents(text, ents_dict)
         return ents_dict
 
+    def _unused_pipes(self) -> List[str]:
+        # only doc.ents is read, everything else in the pipeline is wasted work
+        return [
+            name for name in self.spacy_model.pipe_names if name not in ("tok2vec", "ner")
+        ]
+
+    def _pipe_ents(
+        self, items: Iterable[Tuple[Optional[str], Any]]
+    ) -> Iterator[Tuple[DefaultDict[str, List[str]], Any]]:
+        """
+        run NER over (text, context) pairs with nlp.pipe, in input order
+        empty, memoized and cached texts are sent as "" so that every input gets
+        exactly one doc back, a text already on its way through the model is sent
+        as "" as well and read from the memo once its first copy is done
+        :param items: (text, context) pairs, context is passed through untouched
+        :return: (evi_ents, context) pairs
+        """
+        in_model = set()
+
+        def to_model():
+            for text, context in items:
+                if text in in_model:
+                    yield "", (text, context, _PENDING)
+                    continue
+                ents_dict = self._lookup_ents(text)
+                if ents_dict is None:
+                    in_model.add(text)
+                    yield text, (text, context, None)
+                else:
+                    yield "", (text, context, ents_dict)
+
+        model_items = to_model()
+        # inputs are answered without the model up to the first text it has to see,
+        # so a (lazily loaded) model is never loaded for a run served from the caches
+        for model_text, (text, context, ents_dict) in model_items:
+            if model_text:
+                first_item = (model_text, (text, context, ents_dict))
+                model_items = chain([first_item], model_items)
+                break
+            yield ents_dict, context
+        else:
+            return
+        docs = self._model(model_text).pipe(
+            model_items,
+            as_tuples=True,
+            batch_size=self.ner_batch_size,
+            n_process=self.ner_n_process,
+            disable=self._unused_pipes(),
+        )
+        for doc, (text, context, ents_dict) in docs:
+            if ents_dict is None:
+                ents_dict = self._ents_to_dict(doc.ents)
+                self._store_ents(text, ents_dict)
+                in_model.discard(text)
+            elif ents_dict == _PENDING:
+                # memoized by its first copy by now, unless evicted in between
+                ents_dict = self._get_ents(text)
+            yield ents_dict, context
+
     def __iter__(self):
         for stmt in self.stmts:
             agents = tuple(agent.name if agent else None for agent in stmt.agent_list())
             yield Relation(agents, self._get_rel_type(stmt))
 
-    def generate_evidence_dict(self):
+    def _iter_evidence_records(self) -> Iterator[Tuple[Optional[str], Tuple[str, Dict]]]:
+        """
+        one (evidence text, (pmid, ppi record)) pair per evidence
+        evi_ents is left as a placeholder to be filled in by the NER stage
+        """
         for stmt in self.stmts:
             rel_type = self._get_rel_type(stmt)
             entities = [agent.name if agent else None for agent in stmt.agent_list()]
@@ -127,10 +414,9 @@ class ParsePMCStmts:
                 else:
                     pmid = self.UNK_PMID
                     pmid_url = None
-                evi_ents = self._get_ents(evi.text)
 
                 if len(entities) == 2:
-                    yield pmid, {
+                    record = {
                         KEY1: entities[0],
                         KEY2: entities[1],
                         "rel": rel_type,
@@ -138,34 +424,115 @@ class ParsePMCStmts:
                         "ents": entities,
                         "container": f"{entities[1]} {self._get_container_name(rel_type)}",
                         "text": evi.text,
-                        "evi_ents": evi_ents,
+                        "evi_ents": None,
                         "pmid_url": pmid_url,
                     }
                 elif entities:
-                    yield pmid, {
+                    record = {
                         KEY1: entities[0],
                         KEY2: None,
                         "rel": rel_type,
                         "meta_rel": meta_rel_type,
                         "ents": entities,
                         "text": evi.text,
-                        "evi_ents": evi_ents,
+                        "evi_ents": None,
                         "pmid_url": pmid_url,
                     }
                 else:
-                    yield pmid, {
+                    record = {
                         KEY1: None,
                         KEY2: None,
                         "rel": rel_type,
                         "meta_rel": meta_rel_type,
                         "ents": entities,
                         "text": evi.text,
-                        "evi_ents": evi_ents,
+                        "evi_ents": None,
                         "pmid_url": pmid_url,
                     }
+                yield evi.text, (pmid, record)
 
-    def generate_pmid_dict(self, to_pkl=True):
-        doc_dict = defaultdict(list)
+    def _iter_shards(self, start: int = 0) -> Iterator[Tuple[List["Statement"], int]]:
+        """
+        contiguous shards of shard_size statements, each with the number of its
+        evidences to skip, statements entirely before the start-th evidence are dropped
+        """
+        stmts = iter(self.stmts)
+        skip = start
+        for stmt in stmts:
+            if len(stmt.evidence) > skip:
+                shard = [stmt] + list(islice(stmts, self.shard_size - 1))
+                break
+            skip -= len(stmt.evidence)
+        else:
+            return
+        while shard:
+            yield shard, skip
+            skip = 0
+            shard = list(islice(stmts, self.shard_size))
+
+    def _map_shards(self, kind: str, start: int = 0) -> Iterator[Tuple[str, Dict]]:
+        """
+        run the "evidence" or "pmid" pass over statement shards in a pool of
+        shard_workers processes, each loading its own copy of the spaCy model
+        records are yielded in statement order, the NER cache hits and misses of the
+        workers are added to the counts of ner_cache
+        """
+        cache = self.ner_cache
+        cache_args = (
+            None
+            if cache is None
+            else (cache.db_path, cache.model_name, cache.model_version, cache.max_entries)
+        )
+        model_name = (
+            None if self.spacy_model is None else get_model_name(self.spacy_model)
+        )
+        initargs = (
+            model_name,
+            cache_args,
+            self.UNK_PMID,
+            self.ner_batch_size,
+        )
+        tasks = ((shard, kind, skip) for shard, skip in self._iter_shards(start))
+        with Pool(self.shard_workers, _init_shard_worker, initargs) as pool:
+            max_pending = 2 * self.shard_workers
+            for records, (hits, misses) in _bounded_imap(
+                pool, _parse_shard, tasks, max_pending
+            ):
+                if cache is not None:
+                    cache.hits += hits
+                    cache.misses += misses
+                for pmid, record in records:
+                    yield self._share_strings(pmid, record)
+
+    def _share_strings(self, pmid: str, record: Dict) -> Tuple[str, Dict]:
+        """
+        the strings a serial run shares between all records (keys, rel, meta_rel,
+        labels, entity texts, UNK_PMID) come back from every shard as separate copies,
+        swap them for the shared ones so that a merged run pickles to the same bytes
+        """
+        record = {sys.intern(key): value for key, value in record.items()}
+        record["rel"] = sys.intern(record["rel"])
+        record["meta_rel"] = sys.intern(record["meta_rel"])
+        record["evi_ents"] = self._canonical_ents(record["evi_ents"])
+        return (self.UNK_PMID if pmid == self.UNK_PMID else pmid), record
+
+    def generate_evidence_dict(self, start: int = 0):
+        """
+        :param start: number of evidences to skip (before NER), to resume a build
+        """
+        if self.shard_workers > 1:
+            yield from self._map_shards("evidence", start)
+            return
+        evidence_records = islice(self._iter_evidence_records(), start, None)
+        for evi_ents, (pmid, record) in self._pipe_ents(evidence_records):
+            record["evi_ents"] = evi_ents
+            yield pmid, record
+
+    def _iter_pmid_records(self) -> Iterator[Tuple[List[str], Tuple[str, Dict]]]:
+        """
+        one (evidence texts, (pmid, ppi record)) pair per statement and pmid
+        evi_ents is left as a placeholder to be filled in by the NER stage
+        """
         for i, stmt in enumerate(self.stmts):
             rel_type = self._get_rel_type(stmt)
             entities = [agent.name if agent else None for agent in stmt.agent_list()]
@@ -179,65 +546,146 @@ class ParsePMCStmts:
                     pmid = self.UNK_PMID
                 tmp_evi_dict[pmid].append(evi.text if evi.text else "")
             for pmid in tmp_evi_dict:
-                all_text = " ".join(tmp_evi_dict[pmid])
-                evi_ents = self._get_ents(all_text.strip())
                 if len(entities) == 2:
-                    doc_dict[pmid].append(
-                        {
-                            KEY1: entities[0],
-                            KEY2: entities[1],
-                            "rel": rel_type,
-                            "meta_rel": meta_rel_type,
-                            "ents": entities,
-                            "container": f"{entities[1]} {self._get_container_name(rel_type)}",
-                            "text": tmp_evi_dict[pmid],
-                            "evi_ents": evi_ents,
-                            "pmid_url": f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
-                            if pmid
-                            else None,
-                        }
-                    )
+                    record = {
+                        KEY1: entities[0],
+                        KEY2: entities[1],
+                        "rel": rel_type,
+                        "meta_rel": meta_rel_type,
+                        "ents": entities,
+                        "container": f"{entities[1]} {self._get_container_name(rel_type)}",
+                        "text": tmp_evi_dict[pmid],
+                        "evi_ents": None,
+                        "pmid_url": f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
+                        if pmid
+                        else None,
+                    }
                 elif entities:
-                    doc_dict[pmid].append(
-                        {
-                            KEY1: entities[0],
-                            KEY2: None,
-                            "rel": rel_type,
-                            "meta_rel": meta_rel_type,
-                            "ents": entities,
-                            "text": tmp_evi_dict[pmid],
-                            "evi_ents": evi_ents,
-                            "pmid_url": f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
-                            if pmid
-                            else None,
-                        }
-                    )
+                    record = {
+                        KEY1: entities[0],
+                        KEY2: None,
+                        "rel": rel_type,
+                        "meta_rel": meta_rel_type,
+                        "ents": entities,
+                        "text": tmp_evi_dict[pmid],
+                        "evi_ents": None,
+                        "pmid_url": f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
+                        if pmid
+                        else None,
+                    }
                 else:
-                    doc_dict[pmid].append(
-                        {
-                            KEY1: None,
-                            KEY2: None,
-                            "rel": rel_type,
-                            "meta_rel": meta_rel_type,
-                            "ents": entities,
-                            "text": tmp_evi_dict[pmid],
-                            "evi_ents": evi_ents,
-                            "pmid_url": f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
-                            if pmid
-                            else None,
-                        }
-                    )
+                    record = {
+                        KEY1: None,
+                        KEY2: None,
+                        "rel": rel_type,
+                        "meta_rel": meta_rel_type,
+                        "ents": entities,
+                        "text": tmp_evi_dict[pmid],
+                        "evi_ents": None,
+                        "pmid_url": f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
+                        if pmid
+                        else None,
+                    }
+                yield tmp_evi_dict[pmid], (pmid, record)
             if (i + 1) % 500 == 0:
                 print(f"working on {i} statements...")
+
+    def _generate_pmid_records(self) -> Iterator[Tuple[str, Dict]]:
+        """
+        the evi_ents of a record are merged from the entities of each of its evidence
+        texts, which are shared with the evidence pass and the other statements
+        """
+
+        def evidence_texts():
+            for texts, (pmid, record) in self._iter_pmid_records():
+                for i, text in enumerate(texts):
+                    yield text, (pmid, record, i == len(texts) - 1)
+
+        merged_ents = defaultdict(list)
+        for evi_ents, (pmid, record, is_last) in self._pipe_ents(evidence_texts()):
+            for label, ents in evi_ents.items():
+                merged_ents[label].extend(ents)
+            if is_last:
+                record["evi_ents"] = merged_ents
+                merged_ents = defaultdict(list)
+                yield pmid, record
+
+    def generate_pmid_dict(self, to_pkl=True):
+        """
+        group the ppi records by pmid, with shard_workers > 1 the shards are processed
+        in parallel and merged in statement order, giving the same dict as a serial run
+        """
+        if self.shard_workers > 1:
+            pmid_records = self._map_shards("pmid")
+        else:
+            pmid_records = self._generate_pmid_records()
+        doc_dict = defaultdict(list)
+        for pmid, record in pmid_records:
+            doc_dict[pmid].append(record)
         if to_pkl:
             pickle_obj_mapping(doc_dict, "../raw_data/pmid_ppi-07-05.pkl")
         return doc_dict
 
 
+def _bounded_imap(pool, func: Callable, tasks: Iterable, max_pending: int) -> Iterator:
+    """
+    pool.imap that only submits a task once fewer than max_pending are in flight,
+    so that tasks are not all pulled (and held) up front
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) == max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+# parser of a shard worker process, set up once by _init_shard_worker
+_shard_parser: Optional[ParsePMCStmts] = None
+
+
+def _init_shard_worker(
+    model_name: Optional[str],
+    cache_args: Optional[Tuple],
+    unk_pmid: str,
+    ner_batch_size: int,
+) -> None:
+    global _shard_parser
+    ner_cache = None if cache_args is None else NERCache(*cache_args)
+    # without a model, like a serial run, only memoized or cached texts can be parsed
+    spacy_model = None if model_name is None else LazySpacyModel(model_name)
+    _shard_parser = ParsePMCStmts(
+        [], spacy_model, unk_pmid, ner_batch_size, ner_cache=ner_cache
+    )
+
+
+def _parse_shard(
+    task: Tuple[List["Statement"], str, int]
+) -> Tuple[List[Tuple[str, Dict]], Tuple[int, int]]:
+    """
+    :return: the records of the shard and the NER cache hits and misses it took
+    """
+    shard, kind, skip = task
+    # the worker's parser (and its NER memo) is reused across shards
+    parser = _shard_parser
+    parser.stmts = shard
+    cache = parser.ner_cache
+    hits, misses = (0, 0) if cache is None else (cache.hits, cache.misses)
+    if kind == "evidence":
+        records = list(parser.generate_evidence_dict(start=skip))
+    else:
+        records = list(parser._generate_pmid_records())
+    if cache is not None:
+        cache.flush()
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return records, (hits, misses)
+
+
 if __name__ == "__main__":
     filename = "../raw_data/PPCA/statements_covid19-7-7.json"
-    nlp = spacy.load("en_ner_bionlp13cg_md")
-    pps = ParsePMCStmts.from_json(filename, spacy_model=nlp)
+    nlp = LazySpacyModel("en_ner_bionlp13cg_md")
+    pps = ParsePMCStmts.from_json_lite(filename, spacy_model=nlp)
     for i, rel in enumerate(pps.generate_evidence_dict()):
         print(rel)
         break
@@ -0,0 +1,53 @@
+from typing import Any
+
+try:
+    from importlib import metadata
+except ImportError:
+    # python < 3.8
+    try:
+        import importlib_metadata as metadata
+    except ImportError:
+        metadata = None
+
+
+class LazySpacyModel(object):
+    def __init__(self, model_name: str):
+        """
+        a spaCy model that is only loaded (spacy imported included) on first use,
+        so that runs served from cached docs or cached entities never pay for it
+        attribute access and calls are passed on to the loaded model
+        :param model_name: spaCy model package name, e.g. en_ner_bionlp13cg_md
+        """
+        self.model_name = model_name
+        self._model = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            import spacy
+
+            print(f"loading NER model {self.model_name}...")
+            self._model = spacy.load(self.model_name)
+        return self._model
+
+    @property
+    def model_version(self) -> str:
+        # read from the installed package, falling back to loading the model
+        if metadata is not None:
+            try:
+                return metadata.version(self.model_name)
+            except metadata.PackageNotFoundError:
+                pass
+        return self.model.meta["version"]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __call__(self, text: str) -> Any:
+        return self.model(text)
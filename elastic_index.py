@@ -1,7 +1,18 @@
+import re
+import time
+import threading
+from os import path, remove
+from collections import ChainMap
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from elasticsearch import Elasticsearch, helpers
 from elasticsearch_dsl import Index, Document, Text, Keyword, InnerDoc, Date
 from elasticsearch_dsl.connections import connections
 
+from data import pickle_obj_mapping, load_pickled_obj
+from data.doc_ids import content_hash
+
 
 class CovidMeta(Document):
     """
@@ -26,32 +37,223 @@ class CovidMeta(Document):
         return super(CovidMeta, self).save(*args, **kwargs)
 
 
+class _LockedIterator(object):
+    """
+    share one generator between the bulk worker threads
+    """
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._it)
+
+
 class ESIndex(object):
-    def __init__(self, index_name, docs):
+    def __init__(
+        self,
+        index_name,
+        docs,
+        hosts=None,
+        ingest_profile: bool = True,
+        force_merge: bool = False,
+        retention: int = 2,
+        manifest_path: Optional[str] = None,
+        delta: bool = False,
+        **bulk_options,
+    ):
+        """
+        build a new generation of an index and point the index_name alias to it
+        the alias is only swapped (atomically) after the load and the doc count check
+        pass, so the previous generation keeps serving until then
+        :param index_name: es alias, generations are named {index_name}-{timestamp}
+        :param docs: iterable of doc dicts, None to only create a new (empty) generation,
+        the alias, the older generations and the manifest are left alone then
+        :param hosts: es hosts, defaults to your host
+        :param ingest_profile: load with refresh and replicas disabled, see
+        ESIndex.ingest_settings
+        :param force_merge: force merge the index into one segment after loading
+        :param retention: number of generations to keep, including the new one
+        :param manifest_path: pickle of {_id: content hash} of the indexed docs, written
+        after every successful load of docs that all have a doc_id
+        :param delta: only send the index/delete actions that differ from the manifest
+        to the live index instead of building a new generation, falls back to a full
+        build if there is no manifest or live index yet
+        every doc needs a stable doc_id (see data.doc_ids), positional ids would shift
+        :param bulk_options: thread_count, chunk_size, max_chunk_bytes, max_retries,
+        initial_backoff, see ESIndex.load
+        """
         # connect to your host (for elasticsearch)
         connections.create_connection(
-            hosts=["yourhost"],
+            hosts=hosts or ["yourhost"],
             timeout=100,
         )
-        self.index = index_name
+        self.alias = index_name
+        self.index = f"{index_name}-{time.strftime('%Y%m%d%H%M%S')}"
         # connect to your host (for elasticsearch-dsl)
         self.es = Elasticsearch(
-            [{"host": "your-host", "port": 0000}],
+            hosts or [{"host": "your-host", "port": 0000}],
             timeout=200,
         )
+        self.manifest_path = manifest_path
+        # cleared by the first doc without a doc_id, its _id is only a position
+        self.stable_ids = True
+        self.old_manifest = None
+        self.new_manifest = None if manifest_path is None else {}
+        if delta and manifest_path is not None and path.exists(manifest_path):
+            if self.es.indices.exists_alias(name=self.alias):
+                self.old_manifest = load_pickled_obj(manifest_path)
+                (self.index,) = self.es.indices.get_alias(name=self.alias)
+        if self.old_manifest is not None:
+            print(f"delta loading into {self.index}...")
+            self._load_delta(docs, **bulk_options)
+        else:
+            if delta:
+                print(f"no manifest or live index for {self.alias}, doing a full build")
+            self._build_generation(docs, ingest_profile, force_merge, **bulk_options)
+            if docs is None:
+                print(f"created {self.index}, {self.alias} stays on its current index")
+                return
+            self.swap_alias()
+            self.prune_generations(retention)
+        if self.manifest_path is not None and self.stable_ids:
+            pickle_obj_mapping(self.new_manifest, self.manifest_path)
+            print(f"Writing manifest to {self.manifest_path}...")
+        elif self.manifest_path is not None and path.exists(self.manifest_path):
+            # the manifest of the previous generation does not describe this one
+            remove(self.manifest_path)
+            print(f"docs without doc_id, removed {self.manifest_path}")
+
+    def _build_generation(self, docs, ingest_profile, force_merge, **bulk_options):
+        """
+        create the new generation and load docs into it, a generation that fails to
+        load or to pass the doc count check is deleted, so that it never counts toward
+        the retention of the good ones
+        """
         es_index = Index(self.index)
-        # delete existing index that has the same name
-        if es_index.exists():
-            es_index.delete()
         es_index.document(CovidMeta)
         es_index.create()
+        try:
+            self._load_generation(docs, ingest_profile, force_merge, **bulk_options)
+        except BaseException:
+            print(f"deleting the failed generation {self.index}...")
+            self.es.indices.delete(index=self.index, ignore_unavailable=True)
+            raise
+
+    def _load_generation(self, docs, ingest_profile, force_merge, **bulk_options):
+        success = 0
         if docs is not None:
-            self.load(docs)
+            if ingest_profile:
+                with self.ingest_settings():
+                    success, errors = self.load(docs, **bulk_options)
+            else:
+                success, errors = self.load(docs, **bulk_options)
+            if errors:
+                raise RuntimeError(
+                    f"{len(errors)} docs failed, {self.alias} stays on its current index"
+                )
+            if force_merge:
+                self.force_merge()
+        if self.new_manifest is not None:
+            # duplicated _ids overwrite each other, only unique ones end up in the index
+            success = len(self.new_manifest)
+        self.check_doc_count(success)
+
+    def _load_delta(self, docs, **bulk_options):
+        _, errors = self.load(docs, **bulk_options)
+        if errors:
+            raise RuntimeError(f"{len(errors)} delta actions failed on {self.index}")
+        self.check_doc_count(len(self.new_manifest))
+
+    def check_doc_count(self, expected: int):
+        self.es.indices.refresh(index=self.index)
+        count = self.es.count(index=self.index)["count"]
+        if count != expected:
+            raise RuntimeError(
+                f"{self.index} has {count} docs but {expected} are expected"
+            )
+
+    def swap_alias(self):
+        """
+        atomically point the alias to the new generation, an old index that still
+        holds the alias name is removed in the same request
+        """
+        actions = []
+        if self.es.indices.exists_alias(name=self.alias):
+            for old_index in self.es.indices.get_alias(name=self.alias):
+                actions.append({"remove": {"index": old_index, "alias": self.alias}})
+        elif self.es.indices.exists(index=self.alias):
+            actions.append({"remove_index": {"index": self.alias}})
+        actions.append({"add": {"index": self.index, "alias": self.alias}})
+        self.es.indices.update_aliases(body={"actions": actions})
+        print(f"{self.alias} -> {self.index}")
+
+    def prune_generations(self, retention: int):
+        pattern = re.compile(rf"{re.escape(self.alias)}-\d{{14}}")
+        generations = sorted(
+            index
+            for index in self.es.indices.get(index=f"{self.alias}-*")
+            if pattern.fullmatch(index)
+        )
+        live = set(self.es.indices.get_alias(name=self.alias))
+        for old_index in generations[: max(len(generations) - retention, 0)]:
+            if old_index not in live:
+                print(f"deleting old generation {old_index}...")
+                self.es.indices.delete(index=old_index)
+
+    @contextmanager
+    def ingest_settings(self, translog_flush_threshold: Optional[str] = "1gb"):
+        """
+        disable refreshes and replicas (and flush the translog less often) while bulk
+        loading, the previous settings are restored even if the load fails
+        :param translog_flush_threshold: translog size that triggers a flush during
+        ingest, None to leave it unchanged
+        """
+        ingest = {"index.refresh_interval": "-1", "index.number_of_replicas": 0}
+        if translog_flush_threshold:
+            ingest["index.translog.flush_threshold_size"] = translog_flush_threshold
+        current = self.es.indices.get_settings(index=self.index, flat_settings=True)
+        current = next(iter(current.values()))["settings"]
+        # settings that were never set explicitly are reset to their defaults by None
+        restore = {key: current.get(key) for key in ingest}
+        print(f"applying ingest settings to {self.index}: {ingest}")
+        self.es.indices.put_settings(index=self.index, body={"settings": ingest})
+        try:
+            yield
+        finally:
+            print(f"restoring settings of {self.index}: {restore}")
+            self.es.indices.put_settings(index=self.index, body={"settings": restore})
+            self.es.indices.refresh(index=self.index)
+
+    def force_merge(self, max_num_segments: int = 1):
+        st = time.time()
+        self.es.indices.forcemerge(
+            index=self.index, max_num_segments=max_num_segments, request_timeout=3600
+        )
+        print(f"force merged {self.index} in {round(time.time() - st, 2)} seconds")
+
+    @staticmethod
+    def _materialize(value):
+        # per-pmid overlays of a shared relation payload, see load_rel_index
+        if isinstance(value, ChainMap):
+            return dict(value)
+        return value
 
     def to_bulk_iterable(self, docs):
         # bulk insertion
         for i, doc in enumerate(docs):
             doc_id = doc.get("doc_id")
+            if doc_id is None:
+                if self.old_manifest is not None:
+                    raise ValueError(
+                        f"doc {i} has no doc_id, delta loads need stable doc ids"
+                    )
+                self.stable_ids = False
             identifier = i if doc_id is None else doc_id
             # doc to be inserted should be consistent with Document mapping we defined above
             yield {
@@ -71,11 +273,111 @@ class ESIndex(object):
                 "journal": doc.get("journal", None),
                 "publish_time": doc.get("publish_time", None),
                 "es_date": doc.get("es_date", None),
-                "action_interactions": doc.get(
-                    "action_interactions", None
+                "action_interactions": self._materialize(
+                    doc.get("action_interactions", None)
                 ),  # for Heng Ji's data
                 "PPIs": doc.get("PPIs", None),  # for John's data,
             }
 
-    def load(self, docs):
-        helpers.bulk(self.es, self.to_bulk_iterable(docs))
+    @staticmethod
+    def _content_hash(action: Dict) -> str:
+        return content_hash(
+            {k: v for k, v in action.items() if k not in ("_type", "_id", "_index")}
+        )
+
+    def _manifest_actions(self, actions: Iterator[Dict]) -> Iterator[Dict]:
+        """
+        record the content hash of every action in the new manifest, in delta mode
+        skip unchanged docs and delete the ones missing from this run
+        """
+        for action in actions:
+            doc_id = str(action["_id"])
+            digest = self._content_hash(action)
+            self.new_manifest[doc_id] = digest
+            if self.old_manifest is None or self.old_manifest.get(doc_id) != digest:
+                yield action
+        if self.old_manifest is not None:
+            for doc_id in self.old_manifest.keys() - self.new_manifest.keys():
+                yield {
+                    "_op_type": "delete",
+                    "_type": "_doc",
+                    "_id": doc_id,
+                    "_index": self.index,
+                }
+
+    def _bulk_worker(
+        self, worker_id: int, actions: _LockedIterator, chunk_size: int, **options
+    ) -> Tuple[int, List[Dict]]:
+        success = 0
+        errors = []
+        st = time.time()
+        for ok, item in helpers.streaming_bulk(
+            self.es,
+            actions,
+            chunk_size=chunk_size,
+            raise_on_error=False,
+            raise_on_exception=False,
+            **options,
+        ):
+            if ok or item.get("delete", {}).get("status") == 404:
+                success += 1
+            else:
+                errors.append(item)
+            if (success + len(errors)) % chunk_size == 0:
+                spent = time.time() - st
+                print(
+                    f"[bulk worker {worker_id}] {chunk_size} docs in {round(spent, 2)} "
+                    f"seconds ({round(chunk_size / max(spent, 1e-6))} docs/s)"
+                )
+                st = time.time()
+        return success, errors
+
+    def load(
+        self,
+        docs,
+        thread_count: int = 4,
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 100 * 1024 * 1024,
+        max_retries: int = 5,
+        initial_backoff: int = 2,
+    ) -> Tuple[int, List[Dict]]:
+        """
+        stream docs into the index with thread_count parallel streaming_bulk workers
+        pulling from the same to_bulk_iterable generator, chunks rejected with 429 are
+        retried with exponential backoff
+        :param docs: iterable of doc dicts
+        :param thread_count: number of bulk workers (connections)
+        :param chunk_size: number of docs per bulk request
+        :param max_chunk_bytes: max size of a bulk request in bytes
+        :param max_retries: retries of a chunk rejected with 429
+        :param initial_backoff: seconds to wait before the first retry, doubled after each
+        :return: number of indexed docs and the list of failed items
+        """
+        st = time.time()
+        actions = self.to_bulk_iterable(docs)
+        if self.new_manifest is not None:
+            actions = self._manifest_actions(actions)
+        actions = _LockedIterator(actions)
+        with ThreadPoolExecutor(max_workers=thread_count) as pool:
+            futures = [
+                pool.submit(
+                    self._bulk_worker,
+                    worker_id,
+                    actions,
+                    chunk_size,
+                    max_chunk_bytes=max_chunk_bytes,
+                    max_retries=max_retries,
+                    initial_backoff=initial_backoff,
+                )
+                for worker_id in range(thread_count)
+            ]
+            results = [future.result() for future in futures]
+        success = sum(worker_success for worker_success, _ in results)
+        errors = [error for _, worker_errors in results for error in worker_errors]
+        print(
+            f"indexed {success} docs into {self.index} in {round(time.time() - st, 2)} "
+            f"seconds, {len(errors)} failed"
+        )
+        for error in errors[:10]:
+            print(f"failed: {error}")
+        return success, errors
@@ -1,67 +1,100 @@
 import time
+from os import path, replace
 import attr
 import argparse
-from typing import List, Dict
-from collections import defaultdict
+from typing import Iterable, Dict
+from collections import ChainMap
 
 from elastic_index import ESIndex
-import spacy
 
 from data.parse_pmc_stats import ParsePMCStmts
-from data.meta import ParseMetaData
-from data import pickle_obj_mapping, load_pickled_obj
+from data.ner_cache import NERCache
+from data.spacy_model import LazySpacyModel
+from data.meta import MetaByPmid
+from data import append_records, repair_records, iter_records
+from data.doc_ids import EvidenceIds
 
 
 @attr.s(auto_attribs=True)
 class IndexLoader:
     index_name: str = attr.ib()
-    docs: List[Dict] = attr.ib()
+    docs: Iterable[Dict] = attr.ib()
 
-    def load(self):
+    def load(self, delta=False):
         st = time.time()
         print(f"building index ...")
-        ESIndex(self.index_name, self.docs)
+        ESIndex(
+            self.index_name,
+            self.docs,
+            manifest_path=f"raw_data/{self.index_name}.manifest.pkl",
+            delta=delta,
+        )
         print(f"=== Built {self.index_name} in {round(time.time() - st, 2)} seconds ===")
 
     @staticmethod
-    def _get_meta_docs(meta_pkl="raw_data/sub_metadata.pkl"):
-        meta_data: List[Dict] = load_pickled_obj(meta_pkl)
-        pmid_oriented_meta = {item["pubmed_id"]: item for item in meta_data}
-        return pmid_oriented_meta
+    def _get_meta_docs(meta_pkl="raw_data/sub_metadata.pkl") -> MetaByPmid:
+        return MetaByPmid(iter_records(meta_pkl))
 
     @classmethod
-    def from_pmc_stats(cls, index_name, source_file_path: str, docs_pkl: str):
-        try:
-            docs = load_pickled_obj(docs_pkl)
-        except FileNotFoundError:
-            docs = []
-            nlp = spacy.load("en_ner_bionlp13cg_md")
-            if source_file_path.endswith(".json"):
-                pmc_stats_parser = ParsePMCStmts.from_json(
-                    source_file_path, spacy_model=nlp
-                )
-            elif source_file_path.endswith(".pkl"):
-                pmc_stats_parser = ParsePMCStmts.from_pkl(
-                    source_file_path, spacy_model=nlp
-                )
-            else:
-                raise TypeError(f"Cannot identify file {source_file_path}!")
-            meta_docs = cls._get_meta_docs()
-            meta_parser = ParseMetaData()
-            for i, (pmid, ppi_doc) in enumerate(
-                pmc_stats_parser.generate_evidence_dict()
-            ):
-                tmp_doc = {
-                    "pubmed_id": pmid,
-                    "PPIs": ppi_doc,
-                    "doc_id": pmid + "-" + str(i),
-                }
-                meta_doc = meta_docs.get(pmid, {}).copy()
-                meta_parser(meta_doc)
-                tmp_doc.update(meta_parser.meta_dict)
-                docs.append(tmp_doc)
-                if (i + 1) % 10000 == 0:
-                    print(f"loading {i + 1} documents...")
-                pickle_obj_mapping(docs, docs_pkl)
-            print(f"Writing docs to {docs_pkl}...")
-        return IndexLoader(index_name, docs)
+    def from_pmc_stats(
+        cls,
+        index_name,
+        source_file_path: str,
+        docs_pkl: str,
+        ner_cache_path: str = "raw_data/ner_cache.sqlite",
+        checkpoint_every: int = 1000,
+    ):
+        """
+        build one doc per evidence, docs are checkpointed every checkpoint_every docs
+        to {docs_pkl}.log and a restarted build resumes after the last checkpoint
+        the finished log becomes docs_pkl, the docs are streamed from it
+        """
+        if path.exists(docs_pkl):
+            print(f"streaming docs from {docs_pkl}...")
+            return IndexLoader(index_name, iter_records(docs_pkl))
+        log_path = docs_pkl + ".log"
+        # repeated evidences are numbered, count the ones already in the log
+        evidence_ids = EvidenceIds()
+        start = 0
+        if path.exists(log_path):
+            # the logged docs are streamed to count them, not held in memory
+            repair_records(log_path)
+            for doc in iter_records(log_path, fields=("pubmed_id", "PPIs")):
+                evidence_ids(doc["pubmed_id"], doc["PPIs"])
+                start += 1
+        if start:
+            print(f"resuming after {start} docs from {log_path}...")
+        nlp = LazySpacyModel("en_ner_bionlp13cg_md")
+        ner_cache = NERCache.for_model(ner_cache_path, nlp)
+        if source_file_path.endswith(".json"):
+            pmc_stats_parser = ParsePMCStmts.from_json_lite(
+                source_file_path, spacy_model=nlp, ner_cache=ner_cache
+            )
+        elif source_file_path.endswith(".pkl"):
+            pmc_stats_parser = ParsePMCStmts.from_pkl(
+                source_file_path, spacy_model=nlp, ner_cache=ner_cache
+            )
+        else:
+            raise TypeError(f"Cannot identify file {source_file_path}!")
+        meta_docs = cls._get_meta_docs()
+        batch = []
+        for i, (pmid, ppi_doc) in enumerate(
+            pmc_stats_parser.generate_evidence_dict(start=start), start=start
+        ):
+            tmp_doc = {
+                "pubmed_id": pmid,
+                "PPIs": ppi_doc,
+                "doc_id": evidence_ids(pmid, ppi_doc),
+            }
+            batch.append(ChainMap(tmp_doc, meta_docs[pmid]))
+            if len(batch) == checkpoint_every:
+                append_records(batch, log_path)
+                batch = []
+            if (i + 1) % 10000 == 0:
+                print(f"loading {i + 1} documents...")
+        append_records(batch, log_path)
+        print(f"Writing docs to {docs_pkl}...")
+        replace(log_path, docs_pkl)
+        ner_cache.report()
+        ner_cache.close()
+        return IndexLoader(index_name, iter_records(docs_pkl))
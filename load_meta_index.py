@@ -4,44 +4,78 @@ from os import path
 import pandas as pd
 
 from elastic_index import ESIndex
-from data.meta import ParseMetaData
-from data.doc import ParseJsonDoc
+from data.meta import ParseMetaData, load_compact_meta
+from data.doc import iter_json_fields, SUMMARY_FIELDS
 from data.chem_gene_rel import ParseChemGeneRel
+from data.doc_ids import NumberedIds
 
 
-def load_es_index(index_name, data_dir: str, meta_file: str, rel_parser):
+def load_es_index(
+    index_name,
+    data_dir: str,
+    meta_file: str,
+    rel_parser,
+    delta=False,
+    workers=4,
+    chunk_size=64,
+    compact_file=None,
+):
     """
     build es index using COVID meta csv as the main entry
     :param index_name: es index name
     :param data_dir: directory where you have the meta csv
     :param meta_file: meta csv file name
+    :param delta: only send changed docs, see ESIndex
+    :param workers: number of processes parsing the json docs
+    :param chunk_size: number of json docs sent to a worker at once
+    :param compact_file: parquet written by script/compact_cord19.py, used instead of
+    the meta csv and the json docs
     :return:
     """
     meta_parser = ParseMetaData()
     st = time.time()
-    csv_df = pd.read_csv(path.join(data_dir, meta_file))
+    if compact_file:
+        csv_df = load_compact_meta(compact_file)
+        json_fields = [
+            {"institutions": list(institutions), "countries": list(countries)}
+            if found
+            else {}
+            for institutions, countries, found in zip(
+                csv_df["institutions"], csv_df["countries"], csv_df["json_found"]
+            )
+        ]
+        csv_df = csv_df.drop(columns=[*SUMMARY_FIELDS, "json_found"])
+    else:
+        csv_df = pd.read_csv(path.join(data_dir, meta_file))
+        json_fields = iter_json_fields(
+            data_dir, csv_df["sha"].fillna("").tolist(), workers, chunk_size
+        )
     csv_df = csv_df.astype({"pubmed_id": "int32"}).astype({"pubmed_id": "str"})
+    # parse the date and authors columns of all the rows at once
+    csv_df = meta_parser.parse_frame(csv_df.fillna(""))
     docs = []
     print(f"Building ES index for {len(csv_df)} documents...")
 
-    for i, item in enumerate(csv_df.iloc):
-        item = item.fillna("")
-        item_dict = (
-            item.to_dict()
-        )  # read in each line from meta csv and convert it into a meta dict
-        doc_parser = ParseJsonDoc(data_dir, item_dict["sha"])
-        if doc_parser.fields:
+    meta_dicts = csv_df.to_dict("records")  # each line from meta csv as a meta dict
+    meta_ids = NumberedIds()
+    for i, (item_dict, fields) in enumerate(zip(meta_dicts, json_fields)):
+        if fields:
             item_dict.update(
-                doc_parser.fields
+                fields
             )  # parse each corresponding json doc and update the meta dict
         item_dict.update(
             rel_parser(item_dict["pubmed_id"])
         )  # add interaction actions extracted from each article
-        meta_parser(item_dict)  # further parse the updated meta dict
-        docs.append(meta_parser.meta_dict)
+        # the row number of a paper shifts between metadata releases, its ids do not
+        item_dict["doc_id"] = meta_ids(
+            item_dict.get("cord_uid"), item_dict["sha"], item_dict["pubmed_id"]
+        )
+        docs.append(item_dict)
         if (i + 1) % 1000 == 0:
             print(f"finish loading {i + 1} documents ...")
-    ESIndex(index_name, docs)
+    ESIndex(
+        index_name, docs, manifest_path=f"raw_data/{index_name}.manifest.pkl", delta=delta
+    )
     print(f"=== Built {index_name} in {round(time.time() - st, 4)} seconds ===")
 
 
@@ -54,6 +88,19 @@ if __name__ == "__main__":
     parser.add_argument("index_name")
     parser.add_argument("data_dir")
     parser.add_argument("meta_path")
+    parser.add_argument("--delta", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk_size", type=int, default=64)
+    parser.add_argument("--compact_file")
     args = parser.parse_args()
-    load_es_index(args.index_name, args.data_dir, args.meta_path, rel_parser)
+    load_es_index(
+        args.index_name,
+        args.data_dir,
+        args.meta_path,
+        rel_parser,
+        delta=args.delta,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        compact_file=args.compact_file,
+    )
     # load_es_index('covid_meta_index', 'raw_data', 'sub_meta.csv')
@@ -1,13 +1,35 @@
 import time
-import pickle
 import argparse
-from typing import List, Dict
+from os import path
+from collections import ChainMap
 
 from elastic_index import ESIndex
-import spacy
 
 from data.parse_pmc_stats import ParsePMCStmts
-from data.meta import ParseMetaData
+from data.ner_cache import NERCache
+from data.spacy_model import LazySpacyModel
+from data.meta import MetaByPmid
+from data import iter_records, tee_records
+from data.doc_ids import EvidenceIds
+
+
+def generate_ppi_docs(ppi_parser: ParsePMCStmts, meta_input: str):
+    """
+    one doc per evidence, overlaid on the metadata of its paper
+    """
+    meta_by_pmid = MetaByPmid(iter_records(meta_input))
+    print(f"finish loading {meta_input}...")
+    evidence_ids = EvidenceIds()
+    for i, (pmid, ppi_doc) in enumerate(ppi_parser.generate_evidence_dict()):
+        tmp_doc = {
+            "pubmed_id": pmid,
+            "PPIs": ppi_doc,
+            "doc_id": evidence_ids(pmid, ppi_doc),
+        }
+        # the paper's metadata is parsed once and shared by all of its evidence docs
+        yield ChainMap(tmp_doc, meta_by_pmid[pmid])
+        if (i + 1) % 10000 == 0:
+            print(f"loading {i+1} documents...")
 
 
 def load_es_index(
@@ -15,33 +37,22 @@ def load_es_index(
     ppi_parser: ParsePMCStmts,
     meta_input: str,
     docs_input="raw_data/ppi_docs.pkl",
+    delta=False,
 ):
     """
     build es index using cord19_pmc_stmts_filt.pkl
+    docs are streamed from the parser into the bulk workers (which pull them on
+    demand) and snapshotted to docs_input on the way, a later run streams the snapshot
     """
-    docs = []
-    try:
-        with open(docs_input, "rb") as f:
-            docs = pickle.load(f)
-    except FileNotFoundError:
-        meta_parser = ParseMetaData()
-        with open(meta_input, "rb") as f:
-            meta_data: List[Dict] = pickle.load(f)
-            print(f"finish loading {meta_input}...")
-        pmid_oriented_meta = {item["pubmed_id"]: item for item in meta_data}
-        for i, (pmid, ppi_doc) in enumerate(ppi_parser.generate_evidence_dict()):
-            tmp_doc = {"pubmed_id": pmid, "PPIs": ppi_doc, "doc_id": pmid + "-" + str(i)}
-            meta_doc = pmid_oriented_meta.get(pmid, {}).copy()
-            meta_parser(meta_doc)
-            tmp_doc.update(meta_parser.meta_dict)
-            docs.append(tmp_doc)
-            if (i + 1) % 10000 == 0:
-                print(f"loading {i+1} documents...")
-        with open(docs_input, "wb") as f:
-            pickle.dump(docs, f)
-        print(f"Writing docs to {docs_input}...")
+    if path.exists(docs_input):
+        print(f"streaming docs from {docs_input}...")
+        docs = iter_records(docs_input)
+    else:
+        docs = tee_records(generate_ppi_docs(ppi_parser, meta_input), docs_input)
     st = time.time()
-    ESIndex(index_name, docs)
+    ESIndex(
+        index_name, docs, manifest_path=f"raw_data/{index_name}.manifest.pkl", delta=delta
+    )
     print(f"building index ...")
     print(f"=== Built {index_name} in {round(time.time() - st, 2)} seconds ===")
 
@@ -50,11 +61,22 @@ if __name__ == "__main__":
 
     pmc_stmts_path = "raw_data/PPCA/statements_covid19-7-7.json"
     meta_input_path = "raw_data/sub_metadata-07-05.pkl"
-    nlp = spacy.load("en_ner_bionlp13cg_md")
-    print(f"finish loading NER model...")
-    ppi_parser = ParsePMCStmts.from_json(pmc_stmts_path, spacy_model=nlp)
+    nlp = LazySpacyModel("en_ner_bionlp13cg_md")
+    ner_cache = NERCache.for_model("raw_data/ner_cache.sqlite", nlp)
+    ppi_parser = ParsePMCStmts.from_json_lite(
+        pmc_stmts_path, spacy_model=nlp, ner_cache=ner_cache
+    )
     parser = argparse.ArgumentParser()
     parser.add_argument("index_name")
     parser.add_argument("out_pkl_path")
+    parser.add_argument("--delta", action="store_true")
     args = parser.parse_args()
-    load_es_index(args.index_name, ppi_parser, meta_input_path, args.out_pkl_path)
+    load_es_index(
+        args.index_name,
+        ppi_parser,
+        meta_input_path,
+        args.out_pkl_path,
+        delta=args.delta,
+    )
+    ner_cache.report()
+    ner_cache.close()
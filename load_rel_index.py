@@ -1,41 +1,59 @@
 import time
-import pickle
 import argparse
-from collections import defaultdict
+from os import path
+from collections import defaultdict, ChainMap
 
 from elastic_index import ESIndex
 
 from data.chem_gene_rel import ParseChemGeneRel
 from data.dise_gene_rel import ParseDiseGeneRel
 from data.chem_dis_rel import ParseDiseChemRel
-from data import load_pickled_obj
+from data import iter_records, tee_records
+from data.doc_ids import NumberedIds
 
 
-def load_es_index(index_name, rel_parser, docs_input="raw_data/rel_docs.pkl"):
+def generate_rel_docs(rel_parser):
+    """
+    fan out every relation row to one doc per pmid
+    the per-pmid fields are overlaid on the shared (never mutated) relation payload
+    with a ChainMap, ESIndex turns it into a plain dict at bulk-action time
+    doc ids are hashes of the pmid and the relation row, stable across csv releases,
+    repeated rows (or a pmid listed twice) are numbered
+    """
+    rel_ids = NumberedIds()
+    for i, (rel_doc, pmids_lst) in enumerate(rel_parser):
+        for pmid in pmids_lst:
+            if pmid:
+                pmid_url = f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
+            else:
+                pmid_url = None
+            yield {
+                "pubmed_id": pmid,
+                "action_interactions": ChainMap({"pmid_url": pmid_url}, rel_doc),
+                "doc_id": rel_ids(pmid, rel_doc),
+            }
+        if (i + 1) % 10000 == 0:
+            print(f"loading {i+1} documents...")
+
+
+def load_es_index(
+    index_name, rel_parser, docs_input="raw_data/rel_docs.pkl", delta=False
+):
     """
     build es index using chem_gene_ixns_relation.csv
+    docs are streamed from the parser into the bulk workers (which pull them on
+    demand) and snapshotted to docs_input on the way, a later run streams the snapshot
     """
-    docs = []
-    try:
-        with open(docs_input, "rb") as f:
-            docs = pickle.load(f)
-    except FileNotFoundError:
-        for i, (rel_doc, pmids_lst) in enumerate(rel_parser):
-            for pmid in pmids_lst:
-                if pmid:
-                    pmid_url = f"https://www.ncbi.nlm.nih.gov/pubmed/{pmid}"
-                    rel_doc["pmid_url"] = pmid_url
-                else:
-                    rel_doc["pmid_url"] = None
-                docs.append({"pubmed_id": pmid, "action_interactions": rel_doc})
-            if (i + 1) % 10000 == 0:
-                print(f"loading {i+1} documents...")
-        with open(docs_input, "wb") as f:
-            pickle.dump(docs, f)
-        print(f"Writing docs to {docs_input}...")
+    if path.exists(docs_input):
+        print(f"streaming docs from {docs_input}...")
+        docs = iter_records(docs_input)
+    else:
+        docs = tee_records(generate_rel_docs(rel_parser), docs_input)
     st = time.time()
     print(f"building index ...")
-    ESIndex(index_name, docs)
+    ESIndex(
+        index_name, docs, manifest_path=f"raw_data/{index_name}.manifest.pkl", delta=delta
+    )
     print(f"=== Built {index_name} in {round(time.time() - st, 2)} seconds ===")
 
 
@@ -47,17 +65,22 @@ if __name__ == "__main__":
     chem_gen_rel_path = "raw_data/KG/chem_gene_ixns_relation.csv"
     gene_dis_rel_path = "raw_data/KG/sub_genes_diseases_relation.csv"
     gene_dise_parser = ParseDiseGeneRel(
-        gene_dis_rel_path, gene_mapping_path, dise_mapping_path
+        gene_dis_rel_path, gene_mapping_path, dise_mapping_path, streaming=True
     )
     rel_parser = ParseChemGeneRel(
         chem_gen_rel_path,
         gene_mapping_path,
         chem_mapping_path,
         gene_dise_parser.get_gene_dise_dist(),
+        streaming=True,
     )
     parser = argparse.ArgumentParser()
     parser.add_argument("index_name")
+    parser.add_argument("--delta", action="store_true")
     args = parser.parse_args()
     load_es_index(
-        args.index_name, rel_parser, docs_input="raw_data/chem_gene_dise_rel_with_url.pkl"
+        args.index_name,
+        rel_parser,
+        docs_input="raw_data/chem_gene_dise_rel_with_url.pkl",
+        delta=args.delta,
     )
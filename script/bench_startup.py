@@ -0,0 +1,72 @@
+import sys
+
+sys.path.append("../")
+import argparse
+import subprocess
+from typing import Tuple
+
+# what a warm run of load_ppi_index pays before it looks at its cached docs,
+# eagerly (as it used to) and with the lazy providers
+EAGER_STARTUP = """
+import spacy
+from indra.statements.statements import stmts_from_json_file
+from load_ppi_index import ParsePMCStmts, NERCache
+nlp = spacy.load({model!r})
+ner_cache = NERCache.for_model({ner_cache!r}, nlp)
+ppi_parser = ParsePMCStmts(stmts_from_json_file({stmts_json!r}), nlp, ner_cache=ner_cache)
+"""
+LAZY_STARTUP = """
+from load_ppi_index import ParsePMCStmts, NERCache, LazySpacyModel
+nlp = LazySpacyModel({model!r})
+ner_cache = NERCache.for_model({ner_cache!r}, nlp)
+ppi_parser = ParsePMCStmts.from_json_lite(
+    {stmts_json!r}, spacy_model=nlp, ner_cache=ner_cache
+)
+"""
+REPORT = """
+import resource
+print(time.time() - START, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def time_startup(code: str, cwd: str) -> Tuple[float, float]:
+    """
+    run code in a fresh interpreter
+    :param code:
+    :param cwd: repo root, the load_* scripts are run from there
+    :return: seconds taken and peak memory in MB
+    """
+    code = "import time\nSTART = time.time()\n" + code + REPORT
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=cwd, check=True, capture_output=True, text=True
+    )
+    seconds, max_rss = result.stdout.split()[-2:]
+    return float(seconds), int(max_rss) / 1024
+
+
+def bench_startup(model: str, stmts_json: str, ner_cache: str, repeat: int = 3):
+    """
+    compare the eager and the lazy startup of load_ppi_index, the best of repeat runs
+    :param model: spaCy model name
+    :param stmts_json: INDRA statements json, relative to the repo root
+    :param ner_cache: NER cache sqlite file, relative to the repo root
+    :param repeat:
+    :return:
+    """
+    options = dict(model=model, stmts_json=stmts_json, ner_cache=ner_cache)
+    for name, code in (("eager", EAGER_STARTUP), ("lazy", LAZY_STARTUP)):
+        runs = [time_startup(code.format(**options), "../") for _ in range(repeat)]
+        seconds, max_rss = min(runs)
+        print(f"{name}: {round(seconds, 2)} seconds, {round(max_rss, 1)} MB peak memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="en_ner_bionlp13cg_md")
+    parser.add_argument(
+        "--stmts_json", default="raw_data/PPCA/statements_covid19-7-7.json"
+    )
+    parser.add_argument("--ner_cache", default="raw_data/ner_cache.sqlite")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    bench_startup(args.model, args.stmts_json, args.ner_cache, args.repeat)
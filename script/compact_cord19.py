@@ -0,0 +1,66 @@
+import sys
+
+sys.path.append("../")
+import argparse
+from os import path
+from typing import Sequence
+import pandas as pd
+from data.doc import iter_json_fields, parse_json_summary, SUMMARY_FIELDS
+
+
+def compact_cord19(
+    data_dir: str,
+    meta_file: str,
+    fields: Sequence,
+    out_file: str,
+    workers: int = 4,
+    chunk_size: int = 64,
+):
+    """
+    one-time compaction of the CORD-19 metadata csv and the per-sha fields of the json
+    docs into one parquet file, see data.meta.load_compact_meta
+    :param data_dir: directory of the meta csv and the json docs
+    :param meta_file: meta csv file name
+    :param fields: meta csv columns to keep, sha and pubmed_id are always kept
+    :param out_file: parquet output path
+    :param workers: number of processes parsing the json docs
+    :param chunk_size: number of json docs sent to a worker at once
+    :return:
+    """
+    columns = list(dict.fromkeys(["sha", "pubmed_id", *fields]))
+    csv_df = pd.read_csv(path.join(data_dir, meta_file), usecols=columns, dtype=str)
+    print(f"parsing json docs of {len(csv_df)} documents...")
+    summaries = iter_json_fields(
+        data_dir,
+        csv_df["sha"].fillna("").tolist(),
+        workers,
+        chunk_size,
+        parse=parse_json_summary,
+    )
+    summary_df = pd.DataFrame.from_records(
+        list(summaries), index=csv_df.index, columns=SUMMARY_FIELDS
+    )
+    summary_df["json_found"] = summary_df["sections_count"].notna()
+    for count in SUMMARY_FIELDS[3:]:
+        summary_df[count] = summary_df[count].fillna(0).astype("int32")
+    pd.concat([csv_df, summary_df], axis=1).to_parquet(out_file, index=False)
+    print(f"writing to {out_file}...")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir")
+    parser.add_argument("meta_file")
+    parser.add_argument("out_path")
+    parser.add_argument("fields", nargs="*")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk_size", type=int, default=64)
+    args = parser.parse_args()
+    compact_cord19(
+        args.data_dir,
+        args.meta_file,
+        args.fields,
+        args.out_path,
+        args.workers,
+        args.chunk_size,
+    )
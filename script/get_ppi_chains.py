@@ -1,9 +1,15 @@
 from collections import defaultdict
-from data import load_pickled_obj, pickle_obj_mapping
+from typing import Iterable, List, Optional
+from data import load_pickled_obj, pickle_obj_mapping, iter_records, save_records
+
+
+def sorted_names(names: Iterable[Optional[str]]) -> List[Optional[str]]:
+    # set iteration order changes with the hash seed, sort to keep the docs stable
+    return sorted(names, key=lambda name: (name is None, name or ""))
 
 
 def get_enz_subj_proteins(pkl_file: str, out_file: str):
-    ppi_docs = load_pickled_obj(pkl_file)
+    ppi_docs = iter_records(pkl_file, fields=("PPIs",))
     enz_name = "enz"
     subj_name = "subj"
     other_name = "other"
@@ -22,7 +28,7 @@ def get_enz_subj_proteins(pkl_file: str, out_file: str):
 
 
 def get_protein_container_rel(pkl_file: str, out_file: str):
-    ppi_docs = load_pickled_obj(pkl_file)
+    ppi_docs = iter_records(pkl_file, fields=("PPIs",))
     enz_name = "enz"
     subj_name = "subj"
     other_name = "ent1"
@@ -46,7 +52,7 @@ def get_protein_container_rel(pkl_file: str, out_file: str):
 
 
 def add_fst_level_inference(pkl_file: str, mapping_pkl_file: str, out_file: str) -> None:
-    ppi_docs = load_pickled_obj(pkl_file)
+    ppi_docs = iter_records(pkl_file, fields=("PPIs",))
     protein_mapping = load_pickled_obj(mapping_pkl_file)
     inference_mapping = dict()
 
@@ -109,42 +115,47 @@ def add_fst_infer_to_doc(
         "Dehydroxylation": "Hydroxylation",
         "Myristoylation": "Myristoylation",
     }
-    ppi_docs = load_pickled_obj(pkl_file)
+    ppi_docs = iter_records(pkl_file)
     inference_mapping = load_pickled_obj(inference_mapping_pkl)
     protein_container_mapping = load_pickled_obj(protein_container_mapping_pkl)
 
-    new_docs = []
-    for doc in ppi_docs:
-        if doc["PPIs"]["meta_rel"] == "Modification":
-            act_protein = doc["PPIs"]["enz"]
-            target_protein = doc["PPIs"]["sub"]
-            if not act_protein:
-                act_protein = "Enzyme"
-        elif doc["PPIs"]["meta_rel"] == "RegulateActivity":
-            act_protein = doc["PPIs"]["subj"]
-            target_protein = doc["PPIs"]["obj"]
-        else:
-            act_protein = doc["PPIs"]["ent1"]
-            target_protein = doc["PPIs"]["ent2"]
-        rel = doc["PPIs"]["rel"] + "_by"
-        oppo_rel = oppo_rel_mappings[doc["PPIs"]["rel"]] + "_by"
-        try:
-            rel_by_proteins = list(inference_mapping[act_protein][rel])
-        except KeyError:
-            rel_by_proteins = None
-        try:
-            oppo_rel_by_proteins = list(inference_mapping[act_protein][oppo_rel])
-        except KeyError:
-            oppo_rel_by_proteins = None
-        try:
-            target_protein_container = list(protein_container_mapping[target_protein])
-        except KeyError:
-            target_protein_container = None
-        doc["PPIs"]["rel_by_proteins"] = rel_by_proteins
-        doc["PPIs"]["oppo_rel_by_proteins"] = oppo_rel_by_proteins
-        doc["PPIs"]["target_container"] = target_protein_container
-        new_docs.append(doc)
-    pickle_obj_mapping(new_docs, out_file)
+    def infer_docs():
+        for doc in ppi_docs:
+            if doc["PPIs"]["meta_rel"] == "Modification":
+                act_protein = doc["PPIs"]["enz"]
+                target_protein = doc["PPIs"]["sub"]
+                if not act_protein:
+                    act_protein = "Enzyme"
+            elif doc["PPIs"]["meta_rel"] == "RegulateActivity":
+                act_protein = doc["PPIs"]["subj"]
+                target_protein = doc["PPIs"]["obj"]
+            else:
+                act_protein = doc["PPIs"]["ent1"]
+                target_protein = doc["PPIs"]["ent2"]
+            rel = doc["PPIs"]["rel"] + "_by"
+            oppo_rel = oppo_rel_mappings[doc["PPIs"]["rel"]] + "_by"
+            try:
+                rel_by_proteins = sorted_names(inference_mapping[act_protein][rel])
+            except KeyError:
+                rel_by_proteins = None
+            try:
+                oppo_rel_by_proteins = sorted_names(
+                    inference_mapping[act_protein][oppo_rel]
+                )
+            except KeyError:
+                oppo_rel_by_proteins = None
+            try:
+                target_protein_container = sorted_names(
+                    protein_container_mapping[target_protein]
+                )
+            except KeyError:
+                target_protein_container = None
+            doc["PPIs"]["rel_by_proteins"] = rel_by_proteins
+            doc["PPIs"]["oppo_rel_by_proteins"] = oppo_rel_by_proteins
+            doc["PPIs"]["target_container"] = target_protein_container
+            yield doc
+
+    save_records(infer_docs(), out_file)
 
 
 def main():
@@ -167,7 +178,6 @@ def main():
 if __name__ == "__main__":
     main()
     pkl_file = "../raw_data/ppi_docs_with_infer_0707.pkl"
-    ppi_doc = load_pickled_obj(pkl_file)
-    for i in ppi_doc:
+    for i in iter_records(pkl_file, fields=("PPIs",)):
         print(i["PPIs"])
         break
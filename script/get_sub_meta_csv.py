@@ -1,7 +1,11 @@
+import sys
+
+sys.path.append("../")
 import argparse
 import pickle
 from typing import Sequence
 import pandas as pd
+from data.meta import load_compact_meta
 
 
 def get_sub_meta_csv(
@@ -9,14 +13,17 @@ def get_sub_meta_csv(
 ):
     """
     generate a new covid meta csv based on the given fields
-    :param in_file: original meta csv
+    :param in_file: original meta csv, or its parquet from script/compact_cord19.py
     :param fields: a list of fields you want to keep
     :param allow_empty: allow empty values (N/A)
     :param out_file: output file path
     :param to_pickle: write the output dict into a pickle
     :return:
     """
-    csv_df = pd.read_csv(in_file)
+    if in_file.endswith(".parquet"):
+        csv_df = load_compact_meta(in_file)
+    else:
+        csv_df = pd.read_csv(in_file)
     columns = csv_df.columns.values
     invalid_fields = set(fields) - set(columns)
     if invalid_fields:
@@ -2,57 +2,80 @@ import sys
 
 sys.path.append("../")
 from os.path import join as pjoin
-from data import pickle_obj_mapping
+from typing import Sequence
+from data import pickle_obj_mapping, save_lookup_table
+from data.data_io import ARROW_EXTENSIONS, PARQUET_EXTENSIONS
 import pandas as pd
 import argparse
 
 
-def parse_genes_mapping(input_file: str, output_file: str):
-    pickled = {}
+def read_mapping_csv(input_file: str, key: str, values: Sequence[str]) -> pd.DataFrame:
+    """
+    read only the key and value columns of a mapping csv, all as strings
+    :param input_file: tab separated csv
+    :param key: column of the ids
+    :param values: columns of the names
+    :return: DataFrame with the columns key, *values in that order
+    """
     print(f"reading in {input_file}...")
-    gene_df = pd.read_csv(input_file, delimiter="\t")
-    gene_df.fillna("", inplace=True)
-    print(f"writing pickled mapping to {output_file}...")
-    for line in gene_df.iloc:
-        pickled.update(
-            {str(line.GeneID): {"GeneName": line.GeneName, "GeneSymbol": line.GeneSymbol}}
-        )
-    pickle_obj_mapping(pickled, output_file)
+    columns = [key, *values]
+    mapping_df = pd.read_csv(
+        input_file, delimiter="\t", usecols=columns, dtype=dict.fromkeys(columns, str)
+    )
+    return mapping_df[columns].fillna("")
+
+
+def save_mapping(mapping_df: pd.DataFrame, key: str, output_file: str):
+    """
+    save {key: {value columns}} as a pickled dict, or as a lookup table that
+    load_lookup memory-maps if output_file is .arrow/.feather/.parquet
+    on duplicate keys the last row wins
+    :param mapping_df: DataFrame from read_mapping_csv
+    :param key: column of the ids
+    :param output_file:
+    :return:
+    """
+    print(f"writing mapping to {output_file}...")
+    if output_file.endswith(ARROW_EXTENSIONS + PARQUET_EXTENSIONS):
+        return save_lookup_table(mapping_df, key, output_file)
+    values = mapping_df.drop(columns=key).to_dict("records")
+    pickle_obj_mapping(dict(zip(mapping_df[key], values)), output_file)
+
+
+def parse_genes_mapping(input_file: str, output_file: str):
+    gene_df = read_mapping_csv(input_file, "GeneID", ["GeneName", "GeneSymbol"])
+    save_mapping(gene_df, "GeneID", output_file)
 
 
 def parse_chemicals_mapping(input_file: str, output_file: str):
-    pickled = {}
-    print(f"reading in {input_file}...")
-    chem_df = pd.read_csv(input_file, delimiter="\t")
-    chem_df.fillna("", inplace=True)
-    print(f"writing pickled mapping to {output_file}...")
-    for line in chem_df.iloc:
-        pickled.update({str(line.ChemicalID): {"ChemicalName": line.ChemicalName}})
-    pickle_obj_mapping(pickled, output_file)
+    chem_df = read_mapping_csv(input_file, "ChemicalID", ["ChemicalName"])
+    save_mapping(chem_df, "ChemicalID", output_file)
 
 
 def parse_diseases_mapping(input_file: str, output_file: str):
-    pickled = {}
-    print(f"reading in {input_file}...")
-    dis_df = pd.read_csv(input_file, delimiter="\t")
-    dis_df.fillna("", inplace=True)
-    print(f"writing pickled mapping to {output_file}...")
-    for line in dis_df.iloc:
-        pickled.update({str(line.DiseaseID): {"DiseaseName": line.DiseaseName}})
-    pickle_obj_mapping(pickled, output_file)
+    dis_df = read_mapping_csv(input_file, "DiseaseID", ["DiseaseName"])
+    save_mapping(dis_df, "DiseaseID", output_file)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("input_dir")
     parser.add_argument("output_dir")
+    parser.add_argument(
+        "--ext",
+        default=".pkl",
+        help="extension of the mappings, .arrow or .parquet for lookup tables",
+    )
     args = parser.parse_args()
     parse_genes_mapping(
-        pjoin(args.input_dir, "genes.csv"), pjoin(args.output_dir, "genes_mapping.pkl")
+        pjoin(args.input_dir, "genes.csv"),
+        pjoin(args.output_dir, f"genes_mapping{args.ext}"),
     )
     parse_chemicals_mapping(
-        pjoin(args.input_dir, "chemicals.csv"), pjoin(args.output_dir, "chem_mapping.pkl")
+        pjoin(args.input_dir, "chemicals.csv"),
+        pjoin(args.output_dir, f"chem_mapping{args.ext}"),
     )
     parse_diseases_mapping(
-        pjoin(args.input_dir, "diseases.csv"), pjoin(args.output_dir, "dis_mapping.pkl")
+        pjoin(args.input_dir, "diseases.csv"),
+        pjoin(args.output_dir, f"dis_mapping{args.ext}"),
     )
@@ -1,18 +1,29 @@
-import json
+import sys
+
+sys.path.append("../")
 import pprint
 from os import path
 from collections import Counter
 import argparse
+from data.json_backend import load_json
 
 
 class JsonInspector(object):
+    # everything the _inspect_* methods read, abstract and back_matter are skipped
+    KEYS = (
+        "metadata/title",
+        "metadata/authors",
+        "body_text",
+        "bib_entries",
+        "ref_entries",
+    )
+
     def __init__(self, in_file):
         """
         inspect individual json doc
         :param in_file:
         """
-        with open(in_file, "r") as f:
-            self.doc = json.load(f)
+        self.doc = load_json(in_file, self.KEYS)
         self.info = {}
         self._inspect_meta()
         self._inspect_body_text()
@@ -0,0 +1,5 @@
+import sys
+from os import path
+
+# the repo root, where the data package and the load_* scripts live
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), "../"))
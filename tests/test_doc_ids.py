@@ -0,0 +1,121 @@
+import os
+import sys
+import subprocess
+from os import path
+
+from data.doc_ids import EvidenceIds, NumberedIds, content_hash, stable_doc_id
+
+REPO_ROOT = path.join(path.dirname(path.abspath(__file__)), "../")
+
+# builds docs the way the relation and ppi chain pipelines do, from set-valued
+# mappings, and prints their content hashes
+HASH_DOCS = """
+import sys
+sys.path.append("script")
+from data import pickle_obj_mapping, iter_records, save_records
+from data.doc_ids import content_hash
+from data.chem_gene_rel import ParseChemGeneRel
+import get_ppi_chains
+
+tmp_dir = sys.argv[1]
+diseases = {f"disease {i}" for i in range(20)}
+rel_parser = ParseChemGeneRel(
+    f"{tmp_dir}/chem_gene.csv",
+    f"{tmp_dir}/genes.pkl",
+    f"{tmp_dir}/chems.pkl",
+    {"1": diseases, "2": {"asthma", "flu"}},
+)
+hashes = [content_hash(rel_doc) for rel_doc, _ in rel_parser]
+hashes.append(content_hash({"diseases": diseases}))
+
+proteins = [f"P{i}" for i in range(12)]
+ppi_docs = [
+    {"PPIs": {"meta_rel": "RegulateActivity", "rel": rel, "subj": subj, "obj": obj,
+              "container": f"{obj} container {i}"}}
+    for i, (subj, obj) in enumerate(zip(proteins, reversed(proteins)))
+    for rel in ("Activation", "Inhibition")
+]
+save_records(ppi_docs, f"{tmp_dir}/ppi_docs.pkl")
+get_ppi_chains.get_enz_subj_proteins(f"{tmp_dir}/ppi_docs.pkl", f"{tmp_dir}/names.pkl")
+get_ppi_chains.get_protein_container_rel(
+    f"{tmp_dir}/ppi_docs.pkl", f"{tmp_dir}/containers.pkl"
+)
+get_ppi_chains.add_fst_level_inference(
+    f"{tmp_dir}/ppi_docs.pkl", f"{tmp_dir}/names.pkl", f"{tmp_dir}/inference.pkl"
+)
+get_ppi_chains.add_fst_infer_to_doc(
+    f"{tmp_dir}/ppi_docs.pkl",
+    f"{tmp_dir}/inference.pkl",
+    f"{tmp_dir}/containers.pkl",
+    f"{tmp_dir}/ppi_docs_with_infer.pkl",
+)
+hashes += [
+    content_hash(doc) for doc in iter_records(f"{tmp_dir}/ppi_docs_with_infer.pkl")
+]
+print(" ".join(hashes))
+"""
+
+
+def hash_docs(tmp_dir: str, hash_seed: str):
+    env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+    result = subprocess.run(
+        [sys.executable, "-c", HASH_DOCS, tmp_dir],
+        cwd=REPO_ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.split("\n")[-2].split()
+
+
+def test_content_hash_is_stable_across_hash_seeds(tmp_path):
+    from data import pickle_obj_mapping
+
+    with open(tmp_path / "chem_gene.csv", "w") as f:
+        f.write("ChemicalID\tGeneID\tOrganismID\tInteractionActions\tpmids\n")
+        f.write("D001\t1\t9606\tincreases^expression\t11|12\n")
+        f.write("D002\t2\t\tdecreases^activity|affects^binding\t13\n")
+    pickle_obj_mapping(
+        {
+            "1": {"GeneName": "one", "GeneSymbol": "ONE"},
+            "2": {"GeneName": "two", "GeneSymbol": "TWO"},
+        },
+        str(tmp_path / "genes.pkl"),
+    )
+    pickle_obj_mapping(
+        {"MESH:D001": {"ChemicalName": "a"}, "MESH:D002": {"ChemicalName": "b"}},
+        str(tmp_path / "chems.pkl"),
+    )
+    hashes = hash_docs(str(tmp_path), "1")
+    assert len(hashes) == 2 + 1 + 24
+    assert hashes == hash_docs(str(tmp_path), "2")
+
+
+def test_content_hash_ignores_key_and_set_order():
+    unordered = content_hash({"b": {"y", "x"}, "a": 1})
+    assert content_hash({"a": 1, "b": {"x", "y"}}) == unordered
+    assert content_hash(["x", "y"]) != content_hash(["y", "x"])
+    assert stable_doc_id("uid", "sha", "1") != stable_doc_id("uid", "sha", "2")
+
+
+def test_evidence_ids_number_repeats():
+    evidence_ids = EvidenceIds()
+    record = {"rel": "Activation", "text": "A activates B", "evi_ents": {"all": ["A"]}}
+    first = evidence_ids("1", record)
+    # evi_ents depend on the NER model, they are not part of the id
+    repeat = evidence_ids("1", dict(record, evi_ents={}))
+    assert repeat == f"{first}-1"
+    assert evidence_ids("2", record).startswith("2-")
+    assert EvidenceIds()("1", record) == first
+
+
+def test_numbered_ids_keep_repeated_rows():
+    rel_ids = NumberedIds()
+    row = {"ChemicalID": "D001", "GeneID": "1", "InteractionActions": ["++ expression"]}
+    # a row repeated in the csv, with a pmid listed twice, and another pmid
+    ids = [rel_ids(pmid, dict(row)) for pmid in ["11", "11", "12"]]
+    ids.append(rel_ids("11", dict(row)))
+    assert len(set(ids)) == 4
+    assert ids[1] == f"{ids[0]}-1" and ids[3] == f"{ids[0]}-2"
+    assert ids[0] == stable_doc_id("11", row)
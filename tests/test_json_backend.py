@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from data import json_backend
+
+ITEMS = [
+    2.5,
+    -0.125,
+    1e5,
+    6.02e23,
+    -1.5e-7,
+    10,
+    0,
+    "a, b]",
+    True,
+    None,
+    {"pmid": "31", "score": 3.25e-2},
+    [1.75, [], {}],
+]
+
+
+@pytest.mark.parametrize(
+    "text", [json.dumps(ITEMS), json.dumps(ITEMS, indent=2), "[2.5]", "[1E+5 , 7]"]
+)
+def test_fallback_decodes_items_split_at_any_chunk_boundary(monkeypatch, tmp_path, text):
+    monkeypatch.setattr(json_backend, "ijson", None)
+    path = tmp_path / "items.json"
+    path.write_text(text)
+    for chunk_size in range(1, len(text) + 2):
+        items = list(json_backend.iter_json_array(str(path), chunk_size=chunk_size))
+        assert items == json.loads(text), chunk_size
+
+
+@pytest.mark.parametrize("text", ["[2.5", "[2.5,", "[1e5 7]"])
+def test_fallback_rejects_incomplete_arrays(monkeypatch, tmp_path, text):
+    monkeypatch.setattr(json_backend, "ijson", None)
+    path = tmp_path / "items.json"
+    path.write_text(text)
+    for chunk_size in range(1, len(text) + 2):
+        with pytest.raises(ValueError):
+            list(json_backend.iter_json_array(str(path), chunk_size=chunk_size))
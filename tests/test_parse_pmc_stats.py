@@ -0,0 +1,156 @@
+import sys
+import json
+import pickle
+import random
+import shutil
+import multiprocessing
+from types import ModuleType
+from itertools import islice
+
+import pytest
+
+from data.ner_cache import NERCache
+from data.spacy_model import LazySpacyModel
+from data.parse_pmc_stats import ParsePMCStmts
+
+WORDS = ["ACE2", "TMPRSS2", "IL6", "STAT3", "remdesivir", "binds", "and", "in", "cells"]
+
+
+class StubEnt(object):
+    def __init__(self, text: str, label: str):
+        # the same string object on every access, so the label and "all" lists of a
+        # freshly computed evi_ents share it, unlike ones decoded from the memo
+        self.text = text
+        self.label_ = label
+
+
+class StubDoc(object):
+    def __init__(self, text: str):
+        self.ents = [
+            StubEnt(word, "SIMPLE_CHEMICAL" if word.islower() else "GENE_OR_GENE_PRODUCT")
+            for word in text.split(" ")
+            if word[:1].isupper() or word == "remdesivir"
+        ]
+
+
+class StubModel(object):
+    pipe_names = ["tok2vec", "tagger", "ner"]
+    meta = {"lang": "en", "name": "stub_ner", "version": "1.0"}
+
+    def __call__(self, text: str) -> StubDoc:
+        return StubDoc(text)
+
+    def pipe(self, items, as_tuples=False, batch_size=1000, n_process=1, **options):
+        items = iter(items)
+        while True:
+            # read a batch ahead, like the workers, whose contexts come back pickled
+            batch = list(islice(items, batch_size))
+            if not batch:
+                return
+            for text, context in batch:
+                if n_process > 1:
+                    context = pickle.loads(pickle.dumps(context))
+                yield StubDoc(text), context
+
+
+@pytest.fixture
+def stub_spacy(monkeypatch):
+    # forked shard workers inherit the stub, LazySpacyModel loads it from there
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("shard workers only see the stub spacy module when forked")
+    spacy = ModuleType("spacy")
+    spacy.load = lambda name: StubModel()
+    monkeypatch.setitem(sys.modules, "spacy", spacy)
+
+
+@pytest.fixture
+def stmts_json(tmp_path):
+    # 435 evidences over 100 statements, with repeated texts, missing texts and pmids
+    rng = random.Random(7)
+    sentences = [" ".join(rng.choice(WORDS) for _ in range(6)) for _ in range(120)]
+    stmts = []
+    n_evidence = 0
+    while n_evidence < 435:
+        size = min(rng.randint(1, 8), 435 - n_evidence)
+        evidence = [
+            {
+                "pmid": rng.choice([None, "31", "32", "33", "34", "35"]),
+                "text": rng.choice(sentences + [None]),
+            }
+            for _ in range(size)
+        ]
+        n_evidence += size
+        rel_type = rng.choice(["Activation", "Complex", "Phosphorylation"])
+        agents = rng.sample(WORDS[:5], 2)
+        stmts.append(
+            {
+                "type": rel_type,
+                "subj": {"name": agents[0]},
+                "obj": {"name": agents[1]},
+                "members": [{"name": agent} for agent in agents],
+                "enz": {"name": agents[0]},
+                "sub": {"name": agents[1]},
+                "evidence": evidence,
+            }
+        )
+    path = tmp_path / "stmts.json"
+    path.write_text(json.dumps(stmts))
+    return str(path)
+
+
+def parse(stmts_json: str, cache_path: str, shard_workers: int, kind: str, **ner_options):
+    nlp = LazySpacyModel("stub_ner")
+    ner_cache = NERCache.for_model(cache_path, nlp)
+    parser = ParsePMCStmts.from_json_lite(
+        stmts_json,
+        spacy_model=nlp,
+        ner_cache=ner_cache,
+        shard_workers=shard_workers,
+        shard_size=9,
+        ner_memo_size=40,
+        **ner_options,
+    )
+    if kind == "evidence":
+        result = list(parser.generate_evidence_dict())
+    else:
+        result = parser.generate_pmid_dict(to_pkl=False)
+    lookups = ner_cache.hits + ner_cache.misses
+    ner_cache.close()
+    return result, lookups
+
+
+@pytest.mark.parametrize("kind", ["evidence", "pmid"])
+@pytest.mark.parametrize("warm_cache", [False, True])
+def test_sharded_run_pickles_like_serial(
+    stub_spacy, stmts_json, tmp_path, kind, warm_cache
+):
+    serial_cache = str(tmp_path / "serial.sqlite")
+    sharded_cache = str(tmp_path / "sharded.sqlite")
+    if warm_cache:
+        # texts come from the NER cache instead of the model
+        parse(stmts_json, serial_cache, 1, kind)
+        shutil.copy(serial_cache, sharded_cache)
+    serial, _ = parse(stmts_json, serial_cache, 1, kind)
+    sharded, lookups = parse(stmts_json, sharded_cache, 3, kind)
+    assert lookups > 0
+    if kind == "evidence":
+        assert len(serial) == 435
+        for serial_record, sharded_record in zip(serial, sharded):
+            assert pickle.dumps(serial_record) == pickle.dumps(sharded_record)
+    assert pickle.dumps(serial) == pickle.dumps(sharded)
+
+
+@pytest.mark.parametrize("kind", ["evidence", "pmid"])
+def test_repeated_texts_survive_pickled_pipe_contexts(
+    stub_spacy, stmts_json, tmp_path, kind
+):
+    serial, _ = parse(stmts_json, str(tmp_path / "serial.sqlite"), 1, kind)
+    multi, _ = parse(
+        stmts_json,
+        str(tmp_path / "multi.sqlite"),
+        1,
+        kind,
+        ner_n_process=2,
+        ner_batch_size=16,
+    )
+    assert multi == serial